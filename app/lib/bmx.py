@@ -3,9 +3,34 @@ A class to communicate with the BMX temperature/pressure
 sensor
 """
 
-from bmx280_bl import BMX280
+from bmx280_bl import BMX280, NORMAL, FORCED, MPUException
+from calibration import Calibration, LINEAR
+from history import Sensor_History
 from settings.settings import settings
-from logging import logging as log
+from collections import namedtuple
+import utime
+
+# One set of values from a sensor, taken together.
+#   raw_temp: the temperature ADC count
+#   temp_c100: int hundredths of a deg C as compensated by the sensor
+#       (before any calibration list adjustment)
+#   pressure: int Pa
+#   humidity: int hundredths of a %RH or None if the sensor doesn't
+#       measure it
+#   ticks: utime.ticks_ms() when it was taken
+Reading = namedtuple("Reading",("raw_temp","temp_c100","pressure","humidity","ticks"))
+
+# Temperatures are kept as int hundredths of a degree (c100 and f100) from
+# the sensor through calibration so none of the maths allocates a float on
+# the heap. The float properties are for formatting and logging.
+
+# (multiplier, divisor) to turn Pa in to hundredths of each pressure unit
+PRESSURE_UNITS = {
+    "hpa":(1,1),
+    "mb":(1,1),
+    "kpa":(1,10),
+    "inhg":(1000,33864), # 1 inHg = 3386.39 Pa
+    }
 
 class BMX:
     
@@ -13,12 +38,26 @@ class BMX:
                  scl_pin=1,
                  sda_pin=0,
                  freq=100000,
-                 bus_id=None,
+                 bus_id=None, # hardware I2C bus or None for SoftI2C
+                 address=0x76, # or 0x77
+                 i2c=None, # a shared I2C obj for the bus
                  name="Unknown BMX",
                  sensor_id=0,
                  temp_calibration_list=[],
-                 press_adjust=0,
+                 press_adjust=0, # Pa added to the pressure
+                 press_units="inhg", # a key of PRESSURE_UNITS
                  temp_scale="f", # f or c
+                 cal_mode=LINEAR, # how temp_calibration_list is applied
+                 mode="forced", # forced or normal
+                 standby_ms=1000, # normal mode time between measurements
+                 iir=0, # IIR filter coefficient; 0, 2, 4, 8 or 16
+                 cal_dir=None, # where to keep a copy of the sensor calibration
+                 deadband=0, # ignore changes smaller than this (degrees of temp_scale)
+                 filter_alpha=1, # weight of each new reading; 1 for no smoothing
+                 max_silent_s=0, # report a change at least this often; 0 for never
+                 history_period_s=600, # keep a reading in self.history this often
+                 history_window_s=10800, # for this long
+                 probe=True, # connect to the sensor now. See connect()
                  ):
         
         self.bmx = None
@@ -26,6 +65,8 @@ class BMX:
         self.sda_pin = sda_pin
         self.freq = freq
         self.bus_id = bus_id
+        self.address = address
+        self.i2c = i2c
         self.name=name
         self.sensor_id = sensor_id
         self.temp_scale = str(temp_scale).lower().strip()
@@ -34,89 +75,222 @@ class BMX:
             self.temp_calibration_list = []
         else:
             self.temp_calibration_list.sort()
+        self.calibration = Calibration(self.temp_calibration_list,cal_mode)
             
-        self._saved_temp = 0
+        self._saved_temp = 0 # tenths of a deg C
+        self._saved_c100 = None # the filtered temp when last saved
+        self._saved_ticks = 0
+        self._filtered = None # smoothed temp in hundredths of a deg C
+        # the filter weight in 256ths and the deadband in hundredths of a deg C
+        self._alpha = min(256,max(1,int(round(filter_alpha * 256))))
+        if self.temp_scale == "f":
+            deadband = deadband / 1.8
+        self._deadband = int(round(deadband * 100))
+        self._max_silent_ms = int(max_silent_s * 1000)
+        self.reading = None # the latest Reading
+        self.summary = None # sampler.Summary the reading came from, if any
         
         self.press_adjust = press_adjust
         self._saved_press = 0
+        self.press_units = str(press_units).lower().strip()
+        if self.press_units not in PRESSURE_UNITS:
+            raise ValueError(f'Unknown pressure units: {press_units}')
+        self._press_mul,self._press_div = PRESSURE_UNITS[self.press_units]
+        # made by connect() once it knows if the sensor has humidity
+        self.history = None
+        self._history_period_s = history_period_s
+        self._history_window_s = history_window_s
         
-        self.bmx = BMX280(
+        self.mode = str(mode).lower().strip()
+        self.standby_ms = standby_ms
+        self.iir = iir
+        self.cal_dir = cal_dir
+        self._i2c_count = 0 # transfers made by drivers since replaced
+        if probe:
+            self.connect()
+
+    def connect(self):
+        """Find the sensor and set it up. Raises an exception if it
+        doesn't answer. Can be called again to re-connect after a failure
+        (set self.i2c first if the bus has been re-made)."""
+        self.disconnect()
+        bmx = BMX280(
             bus_id=self.bus_id,
             scl=self.scl_pin,
             sda=self.sda_pin,
             freq=self.freq,
+            cal_dir=self.cal_dir,
+            i2c=self.i2c,
+            addr=self.address,
+            )
+        if self.mode == "normal":
+            # the sensor measures by itself and reads just fetch the result
+            bmx.configure(NORMAL,standby_ms=self.standby_ms,iir=self.iir)
+        elif self.iir:
+            bmx.configure(FORCED,iir=self.iir)
+        self.bmx = bmx
+        if self.history is None:
+            # kept through re-connects
+            self.history = Sensor_History(self._history_period_s,self._history_window_s,
+                                          humidity=bmx.has_humidity)
+
+    def disconnect(self):
+        """Forget the driver and the current reading, e.g. when the
+        sensor has stopped answering"""
+        if self.bmx:
+            self._i2c_count += self.bmx.i2c_count
+        self.bmx = None
+        self.reading = None
+        self.summary = None
+        # start the smoothing over and count the next reading as a change
+        self._filtered = None
+        self._saved_c100 = None
+
+    @property
+    def connected(self):
+        return self.bmx is not None
+
+    def start_reading(self):
+        """Start a measurement without waiting for it"""
+        if self.bmx is None:
+            raise MPUException(f"{self.name} is not connected")
+        self.bmx.trigger()
+
+    def finish_reading(self):
+        """Wait for the measurement from start_reading to finish and
+        save it as self.reading"""
+        self.bmx.collect()
+        self.summary = None
+        self._accept(self._snapshot())
+        return self.reading
+
+    def set_summary(self,summary):
+        """Use the mean of a sampler.Summary as the current reading"""
+        self.summary = summary
+        self._accept(self._snapshot(summary.mean))
+
+    def _accept(self,reading):
+        """Make reading current, fold it in to the smoothed temp and
+        keep it in the history if one is due"""
+        self.reading = reading
+        self.history.add(reading)
+        if self._filtered is None:
+            self._filtered = reading.temp_c100
+        else:
+            self._filtered += ((reading.temp_c100 - self._filtered) * self._alpha + 128) >> 8
+
+    def _snapshot(self,temp_c100=None):
+        # compensated from the data the last collect() left in the
+        # driver. The driver's properties would take a new measurement
+        # once that is over 200ms old, as it is by the time the sampler
+        # is reduced
+        bmx = self.bmx
+        collected_c100,pressure,humidity = bmx.collected()
+        return Reading(
+            bmx._t_raw,
+            collected_c100 if temp_c100 is None else temp_c100,
+            pressure,
+            humidity,
+            utime.ticks_ms(),
             )
 
     def read(self):
-        """Get a reading"""
-        return {'pres':self.bmx.pressure,'temp':self.bmx.temperature}
-        
+        """Take a new reading and return it"""
+        self.start_reading()
+        return self.finish_reading()
+
+    @property
+    def i2c_count(self):
+        """I2C transfers made with the sensor so far"""
+        if self.bmx is None:
+            return self._i2c_count
+        return self._i2c_count + self.bmx.i2c_count
+
+    def _latest(self):
+        # never goes to the sensor; read() and the registry do that
+        if self.reading is None:
+            raise MPUException(f"No reading from {self.name} yet")
+        return self.reading
+
     @property
     def temperature(self):
-        return self.bmx.temperature
+        """deg C from the latest reading"""
+        return self._latest().temp_c100 / 100
+
+    @property
+    def humidity(self):
+        """%RH from the latest reading or None for a BMP280"""
+        humidity = self._latest().humidity
+        if humidity is None:
+            return None
+        return humidity / 100
+
+    @property
+    def adjusted_temp_c100(self):
+        """The saved temperature with the calibration applied in
+        hundredths of a degree of temp_scale"""
+        return self.calibration.apply(self.saved_temp_c100)
 
     @property
     def adjusted_temperature(self):
-        return self.saved_temp * self.calibration_factor
-    
-   
+        return self.adjusted_temp_c100 / 100
+
     @property
     def calibration_factor(self):
-        """Return the calibation factor based on self.saved_temp
-            tuple order is (raw sensor temp, observed temp)
-        """
-        out = None
+        """The ratio of the adjusted to the saved temperature"""
+        saved = self.saved_temp_c100
+        if saved == 0:
+            return 1
+        return round(self.adjusted_temp_c100 / saved,2)
+
+    def display_c100(self,temp_c100):
+        """A sensor temperature (hundredths of a deg C) in hundredths of a
+        degree of temp_scale with the calibration applied"""
         if self.temp_scale == "f":
-            temp = self.c_to_f(self.temperature)
-        else:
-            temp =  self.temperature
-            
+            temp_c100 = temp_c100 * 9 // 5 + 3200
+        return self.calibration.apply(temp_c100)
 
-        log.debug(f'{self.name} temp: {temp}')
-        hi_temp = temp
-        lo_temp = temp
-        hi_obs = hi_temp
-        lo_obs = lo_temp
-        if len(self.temp_calibration_list) > 0:
-            if lo_temp <= self.temp_calibration_list[0][0]:
-                hi_obs = lo_obs = self.temp_calibration_list[0][1]
-                hi_temp = lo_temp = self.temp_calibration_list[0][0]
-            else:
-                for i in range(len(self.temp_calibration_list)):
-                    r,o = self.temp_calibration_list[i]
-                    hi_obs = o
-                    hi_temp = r
-                    if temp <= r:
-                        break
-                    else:
-                        lo_obs = o
-                        lo_temp = r
-
-            log.debug(f'low: {lo_temp}/{lo_obs}, hi: {hi_temp}/{hi_obs}')
-            out = ((hi_obs/(hi_temp + 0.00001)) + (lo_obs/(lo_temp + 0.00001))) / 2
-            log.debug(f'adj. factor: {out}')
-        if out is None:
-            return 1 # No correction
-        else:
-            return round(out,2)
+    @property
+    def saved_temp_c100(self):
+        """The saved temperature in hundredths of a degree of temp_scale"""
+        if self.temp_scale == "f":
+            # tenths of a deg C to hundredths of a deg F is exactly * 18
+            return self._saved_temp * 18 + 3200
+        return self._saved_temp * 10
 
- 
     @property
     def saved_temp(self):
-        if self.temp_scale == "f":
-            temp = self.c_to_f(self._saved_temp / 10)
-        else:
-            temp =  self._saved_temp / 10
-            
-        return round(temp,2,)
+        return self.saved_temp_c100 / 100
     
+    @property
+    def smoothed_temperature(self):
+        """The filtered temperature in degrees of temp_scale with the
+        calibration applied. Follows every reading, unlike
+        adjusted_temperature which only moves past the deadband"""
+        self._latest()
+        return self.display_c100(self._filtered) / 100
+
     def temp_changed(self):
-        # test/save the temp as an int to reduce rounding error
-        temp = int(round(self.temperature,2) * 10)
-        if temp != self._saved_temp:
-            self._saved_temp = temp
-            return True
-        return False
+        """Save the smoothed temperature and return True if it has moved
+        past the deadband since it was last saved or max_silent_s has gone
+        by. With no deadband any change of a tenth of a degree counts."""
+        self._latest()
+        temp = self._filtered
+        now = utime.ticks_ms()
+        if self._saved_c100 is None:
+            changed = True
+        elif self._deadband:
+            changed = abs(temp - self._saved_c100) >= self._deadband
+        else:
+            changed = (temp + 5) // 10 != self._saved_temp
+        if not changed and self._max_silent_ms:
+            # a heartbeat so the host still hears from us
+            changed = utime.ticks_diff(now,self._saved_ticks) >= self._max_silent_ms
+        if changed:
+            self._saved_c100 = temp
+            self._saved_temp = (temp + 5) // 10
+            self._saved_ticks = now
+        return changed
     
     def c_to_f(self,temp_c):
         """Convert centigrade to Fahrenheit"""
@@ -128,11 +302,29 @@ class BMX:
 
     @property
     def pressure(self):
-        return self.bmx.pressure
-    
+        """Pa from the latest reading"""
+        return self._latest().pressure
+
     @property
-    def adjusted_pressure(self):
+    def adjusted_pressure_pa(self):
         return self.pressure + self.press_adjust
+
+    def display_press100(self,pressure_pa):
+        """A pressure in Pa in hundredths of press_units"""
+        return (pressure_pa * self._press_mul + (self._press_div >> 1)) // self._press_div
+
+    @property
+    def adjusted_pressure(self):
+        """The adjusted pressure in press_units"""
+        return self.display_press100(self.adjusted_pressure_pa) / 100
+
+    @property
+    def tendency(self):
+        """history.RISING, FALLING or STEADY over the history window, or
+        None until there is enough history"""
+        if self.history is None:
+            return None
+        return self.history.tendency()
     
     def mlb_to_ihg(self,mlb):
         """Convert milibars to inches of mercury"""
@@ -140,11 +332,34 @@ class BMX:
         return mlb * 0.00029529980164712
 
 
+def heap_per_pass(sensor,passes=100):
+    """Bytes of heap used by one pass of the temperature maths, from
+    t_fine to the adjusted temperature, on average. Uses gc.mem_alloc
+    so run it on the device (sim.bench --sensor does the same on the host)"""
+    import gc
+    sensor.read()
+    gc.collect()
+    gc.disable()
+    try:
+        start = gc.mem_alloc()
+        for _ in range(passes):
+            temperature_pass(sensor)
+        used = gc.mem_alloc() - start
+    finally:
+        gc.enable()
+    return used / passes
+
+
+def temperature_pass(sensor):
+    """The temperature maths done for each reading, without the I2C"""
+    sensor.bmx._t_fine = 0
+    sensor.bmx.temperature_c100
+    sensor._saved_temp = 0
+    sensor.temp_changed()
+    return sensor.adjusted_temp_c100
+
+
 if __name__ == '__main__':
-    bmx = BMX()
-    bmx.temp_calibration_list = [[60.1, 58], [64, 62], [65, 64], [66, 65], [75.8, 73.4], [77.9, 80]]
-#     print(bmx.c_to_f(bmx.temperature))
-    for temp in [50,60,70,80]:
-        print(f'temp: {temp}')
-        print(bmx.calibration_factor(temp))
-        print(f'result: {temp * bmx.calibration_factor(temp)}')
+    bmx = BMX(bus_id=1,scl_pin=19,sda_pin=18,
+              temp_calibration_list=[[60.1, 58], [64, 62], [65, 64], [66, 65], [75.8, 73.4], [77.9, 80]])
+    print(f'heap per pass: {heap_per_pass(bmx)} bytes')
@@ -9,10 +9,12 @@ Jan. 2023 - Allow creation or either a SoftI2C or hardware I2C instance.
 from machine import SoftI2C, I2C, Pin
 # from machine import I2C, Pin
 from micropython import const
-from ustruct import unpack as unp
+from ustruct import unpack as unp, unpack_from
 import utime 
 
-NORMAL = const(0)
+SLEEP = const(0)
+FORCED = const(1)
+NORMAL = const(3)
 
 BMX280_TEMP_OS_SKIP = const(0)
 BMX280_TEMP_OS_1 = const(1)
@@ -28,6 +30,13 @@ BMX280_PRES_OS_4 = const(3)
 BMX280_PRES_OS_8 = const(4)
 BMX280_PRES_OS_16 = const(5)
 
+BME280_HUM_OS_SKIP = const(0)
+BME280_HUM_OS_1 = const(1)
+BME280_HUM_OS_2 = const(2)
+BME280_HUM_OS_4 = const(3)
+BME280_HUM_OS_8 = const(4)
+BME280_HUM_OS_16 = const(5)
+
 # BMP280 Temperature Registers
 BMX280_REGISTER_DIG_T1 = const(0x88)
 BMX280_REGISTER_DIG_T2 = const(0x8A)
@@ -52,6 +61,7 @@ BME280_REGISTER_DIG_H6 = const(0xE6)
 BME280_REGISTER_DIG_H7 = const(0xE7)
 
 BMX280_REGISTER_ID = const(0xD0)
+BME280_REGISTER_CONTROL_HUM = const(0xF2)
 BMX280_REGISTER_RESET = const(0xE0)
 BMX280_REGISTER_STATUS = const(0xF3)
 BMX280_REGISTER_CONTROL = const(0xF4)
@@ -59,7 +69,24 @@ BMX280_REGISTER_CONFIG = const(0xF5)  # IIR filter config
 
 BMX280_REGISTER_DATA = const(0xF7)
 
-BMX280_I2C_ADDR = const(0x76)
+# the calibration blocks: T1-T3 and P1-P9, H1, H2-H6
+_CAL_TP_SIZE = const(24)
+_CAL_H_SIZE = const(7)
+_CAL_SIZE = const(32) # with H1 between the blocks
+
+BMX280_STATUS_MEASURING = const(0x08)
+
+# samples taken for each oversampling setting
+_OS_SAMPLES = (0,1,2,4,8,16)
+# normal mode time between measurements (ms) for each standby setting
+_STANDBY_MS = (0.5,62.5,125,250,500,1000)
+# IIR filter coefficient for each filter setting
+_IIR_COEFFICIENTS = (0,2,4,8,16)
+
+BMX280_I2C_ADDR = const(0x76) # 0x77 with SDO high
+
+BMP280_CHIP_ID = const(0x58)
+BME280_CHIP_ID = const(0x60)
 
 class MPUException(OSError):
     '''
@@ -70,87 +97,137 @@ class MPUException(OSError):
 class BMX280():
     _I2Cerror = "I2C failure when communicating with the BMP/E"
     # BMP280 = 0x58, BME280 = 0x60, BME680 = 0x61
-    _chip_id = 0x58
+    _chip_ids = (BMP280_CHIP_ID, BME280_CHIP_ID)
+    _chip_id = BMP280_CHIP_ID
 
     _i2c_addr = BMX280_I2C_ADDR
 
-    def __init__(self,scl=15,sda=4,freq=500000, bus_id=None):
-        
+    def __init__(self,scl=15,sda=4,freq=500000, bus_id=None, cal_dir=None, i2c=None, addr=BMX280_I2C_ADDR):
+        """bus_id: hardware I2C bus or None for a SoftI2C bus on scl and sda
+        cal_dir: directory to keep a copy of the calibration
+            coefficients in so later starts don't have to read them all.
+            None to always read them from the sensor.
+        i2c: an I2C or SoftI2C object to use instead of making one. Lets
+            sensors on the same pins share it.
+        addr: 0x76 or 0x77"""
         
+        self._i2c_addr = addr
         self._buf1 = bytearray(1)
         self._buf2 = bytearray(2)
+        self._cal_buf = bytearray(_CAL_SIZE)
+        # reading a measurement reuses these so it doesn't allocate
+        self._data_buf = bytearray(8)
+        self._data_view = memoryview(self._data_buf)[:6]
+        self.i2c_count = 0 # I2C transfers made
+
+        if i2c is None:
+            scl_pin = Pin(scl, Pin.OUT)
+            sda_pin = Pin(sda, Pin.IN)
+            
+            if bus_id is not None:
+                i2c = I2C(id=bus_id,scl=scl_pin, sda=sda_pin,freq=freq)
+            else:
+                i2c = SoftI2C(scl=scl_pin, sda=sda_pin,freq=freq)
+        self._i2c = i2c
 
-        scl_pin = Pin(scl, Pin.OUT)
-        sda_pin = Pin(sda, Pin.IN)
-        
-        if bus_id:
-            self._i2c = I2C(id=bus_id,scl=scl_pin, sda=sda_pin,freq=freq)
-        else:
-            self._i2c = SoftI2C(scl=scl_pin, sda=sda_pin,freq=freq)
-
-        self.chip_id
+        self._chip_id = self.chip_id
 
+        self._cal_file = None
+        if cal_dir:
+            # one file per sensor position
+            self._cal_file = '{}/bmx{:02x}_{}_{}_{:02x}.cal'.format(
+                cal_dir, self._chip_id, 'soft' if bus_id is None else bus_id, scl, self._i2c_addr)
         self._load_calibration()
 #         self.print_calibration()
 
         self._t_os = BMX280_TEMP_OS_2  # temperature oversampling
         self._p_os = BMX280_PRES_OS_1 #BMX280_PRES_OS_16  # pressure oversampling
+        self._h_os = BME280_HUM_OS_1 if self.has_humidity else BME280_HUM_OS_SKIP
+        if self.has_humidity:
+            # only takes effect with the next write to the control register
+            self._write(BME280_REGISTER_CONTROL_HUM, self._h_os)
+        self._mode = FORCED
+        self._standby = 0
+        self._iir = 0
 
         self._t_raw = 0
         self._t_fine = 0
-        self._t = 0
 
         self._p_raw = 0
         self._p = 0
 
-        self._read_wait_ms = 100 
         self._new_read_ms = 200 
         self._last_read_ts = 0
+        self._ready_ts = 0
+        self._triggered = False
         
 
     def _read(self, memaddr, size=1):
+        self.i2c_count += 1
         data = self._i2c.readfrom_mem(self._i2c_addr, memaddr, size)
         return data
         
     def _write(self, addr, b_arr):
         if not type(b_arr) is bytearray:
-            b_arr = bytearray([b_arr])
+            self._buf1[0] = b_arr
+            b_arr = self._buf1
+        self.i2c_count += 1
         return self._i2c.writeto_mem(self._i2c_addr, addr, b_arr)
 
+    def _read_into(self, memaddr, buf):
+        self.i2c_count += 1
+        self._i2c.readfrom_mem_into(self._i2c_addr, memaddr, buf)
+
     def _load_calibration(self):
-        # read calibration data
+        # The coefficients are read as whole blocks in to self._cal_buf:
+        #   0-23: T1-T3, P1-P9 (0x88-0x9F)
+        #   24: H1 (0xA1), 25-31: H2-H6 (0xE1-0xE7); BME280 only
+        buf = self._cal_buf
+        if not self._read_cached_calibration():
+            self._read_into(BMX280_REGISTER_DIG_T1, memoryview(buf)[:_CAL_TP_SIZE])
+            if self._chip_id != BMP280_CHIP_ID:
+                self._read_into(BME280_REGISTER_DIG_H1, memoryview(buf)[_CAL_TP_SIZE:_CAL_TP_SIZE + 1])
+                self._read_into(BME280_REGISTER_DIG_H2, memoryview(buf)[_CAL_TP_SIZE + 1:])
+            self._save_calibration()
+
         # < little-endian
         # H unsigned short
         # h signed short
-        self._T1 = unp('<H', self._read(BMX280_REGISTER_DIG_T1, 2))[0]
-        self._T2 = unp('<h', self._read(BMX280_REGISTER_DIG_T2, 2))[0]
-        self._T3 = unp('<h', self._read(BMX280_REGISTER_DIG_T3, 2))[0]
-        self._P1 = unp('<H', self._read(BMX280_REGISTER_DIG_P1, 2))[0]
-        self._P2 = unp('<h', self._read(BMX280_REGISTER_DIG_P2, 2))[0]
-        self._P3 = unp('<h', self._read(BMX280_REGISTER_DIG_P3, 2))[0]
-        self._P4 = unp('<h', self._read(BMX280_REGISTER_DIG_P4, 2))[0]
-        self._P5 = unp('<h', self._read(BMX280_REGISTER_DIG_P5, 2))[0]
-        self._P6 = unp('<h', self._read(BMX280_REGISTER_DIG_P6, 2))[0]
-        self._P7 = unp('<h', self._read(BMX280_REGISTER_DIG_P7, 2))[0]
-        self._P8 = unp('<h', self._read(BMX280_REGISTER_DIG_P8, 2))[0]
-        self._P9 = unp('<h', self._read(BMX280_REGISTER_DIG_P9, 2))[0]
-
-        if self._chip_id != 0x58:
-            self._H1 = unp('<b', self._read(BME280_REGISTER_DIG_H1, 1))[0]
-            self._H2 = unp('<h', self._read(BME280_REGISTER_DIG_H2, 2))[0]
-            self._H3 = unp('<b', self._read(BME280_REGISTER_DIG_H3, 1))[0]
-            self._H6 = unp('<b', self._read(BME280_REGISTER_DIG_H7, 1))[0]
-
-            h4 = unp('<b', self._read(BME280_REGISTER_DIG_H4, 1))[0]
-            h4 = (h4 << 24) >> 20
-            self._H4 = h4 | (
-                unp('<b', self._read(BME280_REGISTER_DIG_H5, 1))[0] & 0x0F)
-
-            h5 = unp('<b', self._read(BME280_REGISTER_DIG_H6, 1))[0]
-            h5 = (h5 << 24) >> 20
-            self._H5 = h5 | (
-                unp('<b', self._read(BME280_REGISTER_DIG_H5, 1))[0] >> 4 & 0x0F)
-
+        (self._T1, self._T2, self._T3,
+         self._P1, self._P2, self._P3, self._P4, self._P5,
+         self._P6, self._P7, self._P8, self._P9) = unpack_from('<HhhHhhhhhhhh', buf)
+
+        if self._chip_id != BMP280_CHIP_ID:
+            self._H1, self._H2, self._H3, e4, e5, e6, self._H6 = unpack_from('<BhBbBbb', buf, _CAL_TP_SIZE)
+            # H4 and H5 are 12 bit signed values sharing 0xE5
+            self._H4 = (e4 << 4) | (e5 & 0x0F)
+            self._H5 = (e6 << 4) | (e5 >> 4)
+
+    def _read_cached_calibration(self):
+        """Fill self._cal_buf from the cal file if it is there and still
+        matches the sensor. Returns True if it did"""
+        if not self._cal_file:
+            return False
+        try:
+            with open(self._cal_file, 'rb') as f:
+                n = f.readinto(self._cal_buf)
+        except OSError:
+            return False
+        if n != _CAL_SIZE:
+            return False
+        # T1 differs between parts so a different sensor on the same bus
+        # is found with one read
+        return self._read(BMX280_REGISTER_DIG_T1, 2) == self._cal_buf[:2]
+
+    def _save_calibration(self):
+        if not self._cal_file:
+            return
+        try:
+            with open(self._cal_file, 'wb') as f:
+                f.write(self._cal_buf)
+        except OSError:
+            # no room or no directory; read them again next time
+            pass
 
     def print_calibration(self):
         print("T1: {} {}".format(self._T1, type(self._T1)))
@@ -165,7 +242,7 @@ class BMX280():
         print("P7: {} {}".format(self._P7, type(self._P7)))
         print("P8: {} {}".format(self._P8, type(self._P8)))
         print("P9: {} {}".format(self._P9, type(self._P9)))
-        if self._chip_id != 0x58:
+        if self._chip_id != BMP280_CHIP_ID:
             print("H1: {} {}".format(self._H1, type(self._H1)))
             print("H2: {} {}".format(self._H2, type(self._H2)))
             print("H3: {} {}".format(self._H3, type(self._H3)))
@@ -174,69 +251,190 @@ class BMX280():
             print("H6: {} {}".format(self._H6, type(self._H6)))
 
     def power_off(self):
-        self._write(0xF4, 0)
+        self._write(BMX280_REGISTER_CONTROL, SLEEP)
+        self._mode = FORCED
 
     # normal mode
     def power_on(self):
-        self._write(0xF4, 0x2F)
+        self.configure(NORMAL)
+
+    def configure(self, mode=FORCED, t_os=None, p_os=None, standby_ms=None, iir=None, h_os=None):
+        """Set how the sensor measures. Settings left as None are not changed.
+
+        mode: FORCED to take one measurement each time a reading is wanted,
+            NORMAL to have the sensor measure by itself every conversion
+            time + standby_ms. Reads in normal mode just fetch the latest
+            result.
+        t_os, p_os, h_os: BMX280_TEMP_OS_*, BMX280_PRES_OS_* and
+            BME280_HUM_OS_* oversampling. h_os is ignored on a BMP280
+        standby_ms: normal mode time between measurements, rounded down to
+            one the chip has (0.5, 62.5, 125, 250, 500 or 1000)
+        iir: IIR filter coefficient; 0 (off), 2, 4, 8 or 16
+        """
+        if t_os is not None:
+            self._t_os = t_os
+        if p_os is not None:
+            self._p_os = p_os
+        if h_os is not None and self.has_humidity:
+            self._h_os = h_os
+        if standby_ms is not None:
+            self._standby = 0
+            for i in range(len(_STANDBY_MS)):
+                if _STANDBY_MS[i] <= standby_ms:
+                    self._standby = i
+        if iir is not None:
+            if iir not in _IIR_COEFFICIENTS:
+                raise ValueError('IIR coefficient must be one of {}'.format(_IIR_COEFFICIENTS))
+            self._iir = _IIR_COEFFICIENTS.index(iir)
+
+        self._mode = mode
+        self._triggered = False
+        # writes to the config register may be ignored unless asleep
+        self._write(BMX280_REGISTER_CONTROL, SLEEP)
+        self._write(BMX280_REGISTER_CONFIG, (self._standby << 5) | (self._iir << 2))
+        if self.has_humidity:
+            self._write(BME280_REGISTER_CONTROL_HUM, self._h_os)
+        if mode == NORMAL:
+            self._write(BMX280_REGISTER_CONTROL, self._ctrl_meas(NORMAL))
+            # nothing to read until the first measurement is done
+            self._ready_ts = utime.ticks_add(utime.ticks_ms(), self.conversion_ms())
+            self._last_read_ts = utime.ticks_add(utime.ticks_ms(), -self._new_read_ms - 1)
+
+    def _ctrl_meas(self, mode):
+        return (self._t_os << 5) | (self._p_os << 2) | mode
+
+    def conversion_ms(self):
+        """The longest time (ms) a forced measurement can take with the
+        current oversampling. From the datasheet, appendix B"""
+        us = 1250 + 2300 * _OS_SAMPLES[self._t_os]
+        if self._p_os:
+            us += 2300 * _OS_SAMPLES[self._p_os] + 575
+        if self._h_os:
+            us += 2300 * _OS_SAMPLES[self._h_os] + 575
+        return (us + 999) // 1000
+
+    def trigger(self):
+        """Start a forced measurement and return without waiting for it.
+        Call collect() to get the result. Does nothing in normal mode
+        since the sensor is always measuring."""
+        if self._mode == NORMAL:
+            return
+        self._write(BMX280_REGISTER_CONTROL, self._ctrl_meas(FORCED))
+        self._ready_ts = utime.ticks_add(utime.ticks_ms(), self.conversion_ms())
+        self._triggered = True
+
+    def ready(self):
+        """True when the measurement started by trigger() is done"""
+        if utime.ticks_diff(self._ready_ts, utime.ticks_ms()) > 0:
+            return False
+        if self._mode == NORMAL:
+            return True
+        return not self._status() & BMX280_STATUS_MEASURING
+
+    def _status(self):
+        self._read_into(BMX280_REGISTER_STATUS, self._buf1)
+        return self._buf1[0]
+
+    def collect(self):
+        """Wait for the measurement started by trigger() to finish and
+        read it. In normal mode read the latest measurement."""
+        if self._mode == FORCED and not self._triggered:
+            self.trigger()
+        wait = utime.ticks_diff(self._ready_ts, utime.ticks_ms())
+        if wait > 0:
+            utime.sleep_ms(wait)
+        # the conversion time is a maximum but allow for a slow clock.
+        # In normal mode the data registers always hold a whole result
+        tries = self.conversion_ms()
+        while self._mode == FORCED and self._status() & BMX280_STATUS_MEASURING:
+            if tries <= 0:
+                raise MPUException("BMP/E measurement timed out")
+            tries -= 1
+            utime.sleep_ms(1)
+        self._triggered = False
+        self._read_data()
+
+    def _read_data(self):
+        self._last_read_ts = utime.ticks_ms()
+        d = self._data_buf
+        if self._chip_id == BMP280_CHIP_ID:
+            self._read_into(BMX280_REGISTER_DATA, self._data_view)  # read all data at once (as by spec)
+        else:
+            self._read_into(BMX280_REGISTER_DATA, d)  # read all data at once (as by spec)
+            self._h_raw = (d[6] << 8) + d[7]
+        self._p_raw = (d[0] << 12) + (d[1] << 4) + (d[2] >> 4)
+        self._t_raw = (d[3] << 12) + (d[4] << 4) + (d[5] >> 4)
+
+        self._t_fine = 0
+        self._h = 0
+        self._p = 0
 
     def _gauge(self):
-        now = utime.ticks_ms()
-        if utime.ticks_diff(now, self._last_read_ts) > self._new_read_ms:
-            self._last_read_ts = now
-            r = self._t_os + (self._p_os << 3) + (1 << 6)
-            self._write(BMX280_REGISTER_CONTROL, r)
-            utime.sleep_ms(100)  # TODO calc sleep
-            if self._chip_id == 0x58:
-                d = self._read(BMX280_REGISTER_DATA, 6)  # read all data at once (as by spec)
-                self._p_raw = (d[0] << 12) + (d[1] << 4) + (d[2] >> 4)
-                self._t_raw = (d[3] << 12) + (d[4] << 4) + (d[5] >> 4)
-            else:
-                d = self._read(BMX280_REGISTER_DATA, 8)  # read all data at once (as by spec)
-                self._p_raw = (d[0] << 12) + (d[1] << 4) + (d[2] >> 4)
-                self._t_raw = (d[3] << 12) + (d[4] << 4) + (d[5] >> 4)
-                self._h_raw = (d[6] << 8) + d[7]
-
-            self._t_fine = 0
-            self._t = 0
-            self._h = 0
-            self._p = 0
-
-    def _calc_t_fine(self):
-        # From datasheet page 22
-        self._gauge()
+        if self._triggered:
+            self.collect()
+        elif utime.ticks_diff(utime.ticks_ms(), self._last_read_ts) > self._new_read_ms:
+            self.trigger()
+            self.collect()
+
+    def _calc_t_fine(self, gauge=True):
+        # From datasheet page 22. gauge=False uses the data from the
+        # last collect() however old it is
+        if gauge:
+            self._gauge()
         if self._t_fine == 0:
             var1 = (((self._t_raw >> 3) - (self._T1 << 1)) * self._T2) >> 11
             var2 = (((((self._t_raw >> 4) - self._T1) * ((self._t_raw >> 4) - self._T1)) >> 12) * self._T3) >> 14
             self._t_fine = var1 + var2
 
     @property
-    def humidity(self):
-        if self._chip_id != 0x58:
-            var1 = self._calc_t_fine - 76800
-            var1 = (((((self._h_raw << 14) - (self._H5 << 20) - (self._H5 * var1)) +
+    def has_humidity(self):
+        return self._chip_id != BMP280_CHIP_ID
+
+    def _calc_h(self, gauge=True):
+        # From datasheet page 25. Leaves %RH * 1024 in self._h
+        self._calc_t_fine(gauge)
+        if self._h == 0:
+            var1 = self._t_fine - 76800
+            var1 = (((((self._h_raw << 14) - (self._H4 << 20) - (self._H5 * var1)) +
                 16384) >> 15) * (((((((var1 * self._H6) >> 10) * (((var1 *
                                 self._H3) >> 11) + 32768)) >> 10) + 2097152) *
                                 self._H2 + 8192) >> 14))
             var1 = var1 - (((((var1 >> 15) * (var1 >> 15)) >> 7) * self._H1) >> 4)
             var1 = 0 if var1 < 0 else var1
             var1 = 419430400 if var1 > 419430400 else var1
-            return var1 >> 12
+            self._h = var1 >> 12
+
+    @property
+    def humidity(self):
+        # Returns %RH
+        if self._chip_id != BMP280_CHIP_ID:
+            self._calc_h()
+            return self._h / 1024
         else:
             print("This is a BMP not a BME, therefore it cannot measure humidity! :(")
             return 0
 
     @property
-    def temperature(self):
-        self._calc_t_fine()
-        if self._t == 0:
-            self._t = ((self._t_fine * 5 + 128) >> 8) / 100
-        return self._t
+    def humidity_rh100(self):
+        """Humidity in hundredths of a %RH as an int. 0 for a BMP280"""
+        if self._chip_id == BMP280_CHIP_ID:
+            return 0
+        self._calc_h()
+        return (self._h * 100 + 512) >> 10
 
     @property
-    def pressure(self):
-        # From datasheet page 22 (BMP) /25 (BME)
+    def temperature_c100(self):
+        """Temperature in hundredths of a deg C as an int"""
         self._calc_t_fine()
+        return (self._t_fine * 5 + 128) >> 8
+
+    @property
+    def temperature(self):
+        return self.temperature_c100 / 100
+
+    def _calc_p(self, gauge=True):
+        # From datasheet page 22 (BMP) /25 (BME). Leaves Pa * 256 in self._p
+        self._calc_t_fine(gauge)
         if self._p == 0:
             var1 = self._t_fine - 128000
             var2 = var1 * var1 * self._P6
@@ -246,17 +444,38 @@ class BMX280():
             var1 = (((1 << 47) + var1) * self._P1) >> 33
 
             if var1 == 0:
-                return 0
+                return
 
             p = 1048576 - self._p_raw
-            p = int((((p << 31) - var2) * 3125) / var1)
+            p = (((p << 31) - var2) * 3125) // var1
             var1 = (self._P9 * (p >> 13) * (p >> 13)) >> 25
             var2 = (self._P8 * p) >> 19
 
-            p = ((p + var1 + var2) >> 8) + (self._P7 << 4)
-            self._p = p / 256.0
-        return self._p
+            self._p = ((p + var1 + var2) >> 8) + (self._P7 << 4)
+
+    @property
+    def pressure(self):
+        """Pressure in Pa"""
+        self._calc_p()
+        return self._p / 256.0
+
+    @property
+    def pressure_pa(self):
+        """Pressure in Pa as an int"""
+        self._calc_p()
+        return (self._p + 128) >> 8
     
+    def collected(self):
+        """Return (temperature_c100, pressure_pa, humidity_rh100) from
+        the data read by the last collect() without going back to the
+        sensor. humidity_rh100 is None for a BMP280"""
+        self._calc_p(False)
+        humidity = None
+        if self._chip_id != BMP280_CHIP_ID:
+            self._calc_h(False)
+            humidity = (self._h * 100 + 512) >> 10
+        return ((self._t_fine * 5 + 128) >> 8, (self._p + 128) >> 8, humidity)
+
     @property
     def quick_pressure(self):
         self._gauge()
@@ -272,6 +491,6 @@ class BMX280():
             chip_id = unp('<b',self._read(const(0xD0), 1))[0]
         except OSError:
             raise MPUException(self._I2Cerror)
-        if chip_id != self._chip_id:
-            raise ValueError('Bad chip ID ({0}!={1}) retrieved: MPU communication failure'.format(chip_id, self._chip_id))
+        if chip_id not in self._chip_ids:
+            raise ValueError('Bad chip ID ({0} not in {1}) retrieved: MPU communication failure'.format(chip_id, self._chip_ids))
         return chip_id
\ No newline at end of file
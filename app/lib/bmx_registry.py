@@ -0,0 +1,259 @@
+"""
+Keep track of the sensors and the I2C buses they are on.
+
+Any number of sensors can be used. Each hardware I2C bus or pair of
+SoftI2C pins is made once and shared by the sensors on it (up to two,
+at addresses 0x76 and 0x77). Reading the registry starts a measurement
+on every sensor before collecting any so they all convert at once, then
+collects them a bus at a time.
+
+Each sensor has a Sensor_Health. A sensor that fails is SUSPECT and
+after SUSPECT_LIMIT failures in a row it is FAILED: it is left alone
+until its retry time, then its bus is freed and re-made and the sensor
+is connected again. The time between retries doubles up to MAX_RETRY_MS.
+"""
+
+from machine import SoftI2C, I2C, Pin
+from logging import logging as log
+import utime
+
+OK = "ok"
+SUSPECT = "suspect"
+FAILED = "failed"
+
+SUSPECT_LIMIT = 3 # failures in a row before a sensor is FAILED
+FIRST_RETRY_MS = 2000
+MAX_RETRY_MS = 300000
+
+# the I2C objects made so far by bus_key
+_buses = {}
+
+
+def bus_key(bus_id,scl,sda):
+    """Sensors with the same key are on the same bus"""
+    if bus_id is None:
+        return ("soft",scl,sda)
+    return (bus_id,)
+
+
+def get_i2c(bus_id=None,scl=1,sda=0,freq=100000):
+    """Return the I2C object for the bus, made the first time only.
+
+    bus_id: hardware I2C bus or None for a SoftI2C bus on scl and sda
+    """
+    key = bus_key(bus_id,scl,sda)
+    i2c = _buses.get(key)
+    if i2c is None:
+        scl_pin = Pin(scl, Pin.OUT)
+        sda_pin = Pin(sda, Pin.IN)
+        if bus_id is None:
+            i2c = SoftI2C(scl=scl_pin,sda=sda_pin,freq=freq)
+        else:
+            i2c = I2C(id=bus_id,scl=scl_pin,sda=sda_pin,freq=freq)
+        _buses[key] = i2c
+    return i2c
+
+
+def unstick(scl,sda):
+    """Free a bus that a sensor is holding down part way through a
+    byte: clock SCL until it lets go of SDA (9 clocks at most) then send
+    a STOP"""
+    scl_pin = Pin(scl,Pin.OPEN_DRAIN,value=1)
+    sda_pin = Pin(sda,Pin.IN,Pin.PULL_UP)
+    for _ in range(9):
+        if sda_pin.value():
+            break
+        scl_pin.value(0)
+        utime.sleep_us(5)
+        scl_pin.value(1)
+        utime.sleep_us(5)
+    # STOP is SDA going high while SCL is high
+    sda_pin.init(Pin.OPEN_DRAIN,value=0)
+    utime.sleep_us(5)
+    scl_pin.value(1)
+    utime.sleep_us(5)
+    sda_pin.value(1)
+    utime.sleep_us(5)
+
+
+def reset_bus(bus_id=None,scl=1,sda=0,freq=100000):
+    """Unstick the bus and return a new I2C object for it"""
+    _buses.pop(bus_key(bus_id,scl,sda),None)
+    unstick(scl,sda)
+    return get_i2c(bus_id,scl,sda,freq)
+
+
+class Sensor_Health:
+    """How well a sensor is answering.
+
+    Properties:
+        state: OK, SUSPECT or FAILED
+        errors: int: failures in a row
+        failures: int: times it has gone to FAILED
+        recoveries: int: times it has come back from FAILED
+        recovery_ms: int: how long it was FAILED the last time, or None
+    """
+
+    def __init__(self):
+        self.state = OK
+        self.errors = 0
+        self.failures = 0
+        self.recoveries = 0
+        self.recovery_ms = None
+        self.failed_ticks = 0
+        self.retry_ticks = 0
+        self.backoff_ms = FIRST_RETRY_MS
+
+    def stats(self):
+        return {"state":self.state,"failures":self.failures,
+                "recoveries":self.recoveries,"recovery_ms":self.recovery_ms}
+
+
+class Sensor_Registry:
+    """The sensors in display order, grouped by the bus they are on.
+
+    Can be used as a list of the BMX objects. Each one is given a
+    Sensor_Health as sensor.health.
+
+    Properties:
+        sensors: list of BMX objs
+        buses: dict of bus_key: list of the BMX objs on it
+    """
+
+    def __init__(self):
+        self.sensors = []
+        self.buses = {}
+
+    def add(self,sensor):
+        """Add a BMX. If it isn't connected yet it is connected now, or
+        retried later if it doesn't answer.
+
+        Raises ValueError if there is already a sensor at its address on
+        the same bus"""
+        key = bus_key(sensor.bus_id,sensor.scl_pin,sensor.sda_pin)
+        for other in self.buses.get(key,[]):
+            if other.address == sensor.address:
+                raise ValueError(f"{sensor.name} is at the same bus and address ({hex(sensor.address)}) as {other.name}")
+        self.sensors.append(sensor)
+        self.buses.setdefault(key,[]).append(sensor)
+        sensor.health = Sensor_Health()
+        if not sensor.connected:
+            try:
+                sensor.connect()
+            except Exception as e:
+                log.exception(e,f"{sensor.name} sensor Failed")
+                self._fail(sensor)
+
+    def __len__(self):
+        return len(self.sensors)
+
+    def __iter__(self):
+        return iter(self.sensors)
+
+    def __getitem__(self,i):
+        return self.sensors[i]
+
+    def read(self):
+        """Take a reading from every sensor. Each sensor keeps its values
+        in sensor.reading until the next call"""
+        self.recover()
+        started = []
+        for sensors in self.buses.values():
+            for sensor in sensors:
+                if sensor.health.state == FAILED:
+                    continue
+                try:
+                    sensor.start_reading()
+                    started.append(sensor)
+                except Exception as e:
+                    self.failed(sensor,e)
+
+        for sensor in started:
+            try:
+                sensor.finish_reading()
+                self.succeeded(sensor)
+            except Exception as e:
+                self.failed(sensor,e)
+
+    def succeeded(self,sensor):
+        """Record a good read of sensor"""
+        health = sensor.health
+        if health.state != OK:
+            log.info(f"{sensor.name} sensor is answering again")
+            health.state = OK
+        health.errors = 0
+        health.backoff_ms = FIRST_RETRY_MS
+
+    def failed(self,sensor,e):
+        """Record a failed read of sensor"""
+        health = sensor.health
+        health.errors += 1
+        if health.state == OK:
+            log.exception(e,f"Sensor Error for {sensor.name}")
+            health.state = SUSPECT
+        if health.state == SUSPECT and health.errors >= SUSPECT_LIMIT:
+            log.error(f"{sensor.name} sensor Failed after {health.errors} errors")
+            self._fail(sensor)
+
+    def _fail(self,sensor):
+        health = sensor.health
+        health.state = FAILED
+        health.failures += 1
+        health.failed_ticks = utime.ticks_ms()
+        # the backoff only starts over after a good read, so a sensor
+        # that connects but can't be read is tried less and less often
+        health.retry_ticks = utime.ticks_add(health.failed_ticks,health.backoff_ms)
+        health.backoff_ms = min(health.backoff_ms * 2,MAX_RETRY_MS)
+        sensor.disconnect()
+
+    def recover(self):
+        """Try again with the FAILED sensors whose retry time has come.
+        Their bus is unstuck and re-made first"""
+        now = utime.ticks_ms()
+        for sensors in self.buses.values():
+            due = False
+            for sensor in sensors:
+                health = sensor.health
+                if health.state == FAILED and utime.ticks_diff(now,health.retry_ticks) >= 0:
+                    due = True
+            if not due:
+                continue
+
+            first = sensors[0]
+            try:
+                i2c = reset_bus(first.bus_id,first.scl_pin,first.sda_pin,first.freq)
+            except Exception as e:
+                log.exception(e,f"Unable to reset the bus for {first.name}")
+                continue
+            for sensor in sensors:
+                # they all use the new bus object from now on
+                sensor.i2c = i2c
+                if sensor.bmx:
+                    sensor.bmx._i2c = i2c
+
+            for sensor in sensors:
+                health = sensor.health
+                if health.state != FAILED or utime.ticks_diff(now,health.retry_ticks) < 0:
+                    continue
+                try:
+                    sensor.connect()
+                except Exception:
+                    sensor.disconnect()
+                    health.retry_ticks = utime.ticks_add(utime.ticks_ms(),health.backoff_ms)
+                    health.backoff_ms = min(health.backoff_ms * 2,MAX_RETRY_MS)
+                    continue
+                # on probation until a read works; another failure fails it
+                health.state = SUSPECT
+                health.errors = SUSPECT_LIMIT - 1
+                health.recoveries += 1
+                health.recovery_ms = utime.ticks_diff(utime.ticks_ms(),health.failed_ticks)
+                log.info(f"{sensor.name} sensor recovered after {health.recovery_ms} ms")
+
+    def health_stats(self):
+        """A dict of sensor name: Sensor_Health.stats()"""
+        return {sensor.name:sensor.health.stats() for sensor in self.sensors}
+
+    @property
+    def i2c_count(self):
+        """Total I2C transfers made with the sensors"""
+        return sum([sensor.i2c_count for sensor in self.sensors])
@@ -0,0 +1,115 @@
+"""
+Correct sensor temperatures with a list of calibration points.
+
+Each point is (raw sensor temp, observed temp) in the sensor's display
+scale. The points are compiled once in to a table of int breakpoints
+and slopes so correcting a reading is a binary search and one multiply,
+all in int hundredths of a degree.
+
+Modes:
+    LINEAR: straight lines between the points. Outside the points the
+        offset of the nearest one is used.
+    FIT: the least squares straight line through all the points.
+"""
+
+from array import array
+
+LINEAR = "linear"
+FIT = "fit"
+
+_SHIFT = 14 # slopes are fixed point with this many fraction bits
+_ONE = 1 << _SHIFT
+_HALF = _ONE >> 1
+
+
+class Calibration:
+    """A compiled calibration.
+
+    Params:
+        points: list of (raw, observed) pairs in degrees
+        mode: LINEAR or FIT
+
+    apply(temp) takes and returns hundredths of a degree.
+    """
+
+    def __init__(self,points=None,mode=LINEAR):
+        self.mode = str(mode).lower().strip()
+        if self.mode not in (LINEAR,FIT):
+            raise ValueError(f'Unknown calibration mode: {mode}')
+
+        # in hundredths, sorted and with repeated raw values averaged
+        merged = {}
+        for raw,obs in points or []:
+            merged.setdefault(int(round(raw * 100)),[]).append(int(round(obs * 100)))
+        self.points = [(raw,sum(obs) // len(obs)) for raw,obs in sorted(merged.items())]
+
+        self._x = array('i')
+        self._y = array('i')
+        self._slope = array('i')
+        # FIT needs 2 points, with fewer it is the same as LINEAR
+        self._fitted = self.mode == FIT and len(self.points) > 1
+        if self._fitted:
+            slope,offset = self._least_squares()
+            self._x.append(0)
+            self._y.append(int(round(offset)))
+            self._slope.append(int(round(slope * _ONE)))
+        else:
+            for i in range(len(self.points)):
+                x,y = self.points[i]
+                self._x.append(x)
+                self._y.append(y)
+                if i + 1 < len(self.points):
+                    nx,ny = self.points[i + 1]
+                    self._slope.append(((ny - y) * _ONE + ((nx - x) >> 1)) // (nx - x))
+                else:
+                    # past the last point keep its offset
+                    self._slope.append(_ONE)
+
+    def _least_squares(self):
+        n = len(self.points)
+        mean_x = sum([x for x,y in self.points]) / n
+        mean_y = sum([y for x,y in self.points]) / n
+        sxx = sum([(x - mean_x) ** 2 for x,y in self.points])
+        sxy = sum([(x - mean_x) * (y - mean_y) for x,y in self.points])
+        slope = sxy / sxx
+        return slope,mean_y - slope * mean_x
+
+    def apply(self,temp):
+        """Return the corrected temp. Both in int hundredths of a degree"""
+        x = self._x
+        n = len(x)
+        if n == 0:
+            return temp
+        if self._fitted:
+            return self._y[0] + ((temp * self._slope[0] + _HALF) >> _SHIFT)
+        if temp < x[0]:
+            # before the first point keep its offset
+            return temp + self._y[0] - x[0]
+        # the last breakpoint at or below temp
+        lo = 0
+        hi = n
+        while hi - lo > 1:
+            mid = (lo + hi) >> 1
+            if x[mid] <= temp:
+                lo = mid
+            else:
+                hi = mid
+        return self._y[lo] + (((temp - x[lo]) * self._slope[lo] + _HALF) >> _SHIFT)
+
+    def residuals(self):
+        """Return (raw, observed, corrected, observed - corrected) in
+        degrees for each point"""
+        out = []
+        for raw,obs in self.points:
+            fitted = self.apply(raw)
+            out.append((raw / 100,obs / 100,fitted / 100,(obs - fitted) / 100))
+        return out
+
+    def curve(self,start,stop,step=1):
+        """Return (raw, corrected) in degrees from start to stop"""
+        out = []
+        temp = int(round(start * 100))
+        while temp <= int(round(stop * 100)):
+            out.append((temp / 100,self.apply(temp) / 100))
+            temp += int(round(step * 100))
+        return out
@@ -2,6 +2,7 @@
 
 from ili9341 import Display as ili9341, color565
 from machine import Pin
+import time
 from .xglcd_font import XglcdFont
 
 from .display_setup import get_spi
@@ -13,6 +14,9 @@ class Display(ili9341):
     GREEN = color565(81,151,105)
     RED = color565(237,26,27)
     BLUE = color565(59,96,203)
+    # the low and high temperatures
+    LOW_TEMP = color565(56,140,248)
+    HIGH_TEMP = color565(232,0,0)
     
     MAX_Y = 319
     MAX_X = 239
@@ -30,6 +34,12 @@ class Display(ili9341):
 
         settings.display = self
         
+        # stream images with DMA if the hardware supports it
+        try:
+            self.enable_dma(settings.display_spi_id)
+        except AttributeError:
+            pass
+        
         try:
             self.debug = settings.debug
         except:
@@ -62,11 +72,16 @@ class Display(ili9341):
         if not self.body_font:
             # set up the font - Using monospace font for my sanity
             if self.debug: print('Loading fonts...')
+            start = time.ticks_ms()
             self.body_font_width = 12 # the width of each char in px
             self.body_font_height = 24 # the height in px
             self.body_font_spacing = 1 # space between letters in px
-            self.settings.body_font = self.body_font = XglcdFont(self.font_path + self.body_font_name, self.body_font_width, self.body_font_height)
-            if self.debug: print('fonts loaded.')
+            try:
+                cache_bytes = self.settings.font_cache_bytes
+            except AttributeError:
+                cache_bytes = 0
+            self.settings.body_font = self.body_font = XglcdFont(self.font_path + self.body_font_name, self.body_font_width, self.body_font_height, cache_bytes=cache_bytes)
+            if self.debug: print('fonts loaded in {} ms.'.format(time.ticks_diff(time.ticks_ms(),start)))
             
         
     def centered_text(self,msg,
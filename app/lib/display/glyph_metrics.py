@@ -2,14 +2,254 @@
 A class to describe the dimensions and some
 other info about the digit image files in this 
 that are to be used in the weather station display
+
+Decoded glyph images are kept in a small RAM cache (glyph_cache) so
+that redraws don't have to go back to flash for every character.
+
+If a glyph set directory holds a glyphs.atlas file (made with
+digits/img2rgb565.py --atlas) the images are read from it through one
+open file instead of opening a digit_*.raw file for each character.
+Run length encoded atlases are kept encoded in the cache and expanded
+as they are sent to the display (see Metrics.draw).
+
+A mask atlas holds one intensity mask per glyph instead of colours. It
+lives in the glyph set directory (e.g. images/37/) and replaces the
+per-colour sub directories; Metrics.set_color() picks the colour to draw
+with and the palette for each colour is made once and kept.
 """
 
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ucollections import OrderedDict
+from ustruct import unpack, unpack_from
+import os
+
+ATLAS_NAME = "glyphs.atlas"
+ATLAS_MAGIC = b"GLYA"
+
+
+class Atlas:
+    """All the glyph images for one size/colour set packed in one file.
+    
+    The file is opened once and kept open. See digits/img2rgb565.py
+    for the layout.
+    
+    Properties:
+        encoded: bool: True if the glyphs are run length encoded
+        palette: list of 2 byte RGB565 colors for encoded glyphs
+        mask: bool: True if the glyphs are intensity masks
+        levels: int: number of intensity levels in a mask
+        color: int: color565 value a mask was made from
+    """
+    
+    def __init__(self,path):
+        self.path = path
+        self.palette = None
+        self.levels = 0
+        self.color = None
+        self._palettes = {}
+        self._f = open(path,"rb")
+        try:
+            magic, version, count, self.height = unpack("<4sBBH",self._f.read(8))
+            if magic != ATLAS_MAGIC or version not in (1,2,3):
+                raise ValueError("Not a glyph atlas: {}".format(path))
+            
+            self.encoded = version >= 2
+            self.mask = version == 3
+            entry = "<BHHI"
+            if self.mask:
+                self.levels = unpack("<H",self._f.read(2))[0]
+                if self.levels < 2:
+                    # palette_for needs a level for the background and the color
+                    raise ValueError("Glyph atlas mask needs at least 2 levels: {}".format(path))
+                self.color = unpack(">H",self._f.read(2))[0]
+                entry = "<BHHII"
+            elif self.encoded:
+                colors = unpack("<H",self._f.read(2))[0]
+                palette = self._f.read(colors * 2)
+                self.palette = [palette[i*2:i*2+2] for i in range(colors)]
+                entry = "<BHHII"
+            
+            # char: (width, height, offset, size)
+            self.table = {}
+            entry_size = 13 if self.encoded else 9
+            table = self._f.read(entry_size * count)
+            for i in range(count):
+                fields = unpack_from(entry,table,i * entry_size)
+                w, h, offset = fields[1:4]
+                size = fields[4] if self.encoded else w * h * 2
+                self.table[chr(fields[0])] = (w,h,offset,size)
+        except Exception:
+            self._f.close()
+            raise
+            
+    def read(self,c):
+        """Return the RGB565 data for char c"""
+        if self.mask:
+            return self.decode(c,self.read_encoded(c),self.palette_for(self.color))
+        if self.encoded:
+            return self.decode(c,self.read_encoded(c))
+        return self.read_encoded(c)
+    
+    def read_encoded(self,c):
+        """Return the data for char c as it is stored in the file"""
+        w, h, offset, size = self.table[c]
+        self._f.seek(offset)
+        return self._f.read(size)
+    
+    def palette_for(self,color,background=0):
+        """Return the palette to draw a mask in color (color565) over
+        background. Each one is only worked out once"""
+        key = (color,background)
+        palette = self._palettes.get(key)
+        if palette is None:
+            palette = []
+            top = self.levels - 1
+            for level in range(self.levels):
+                value = 0
+                # blend each of the red, green and blue fields
+                for mask in (0xF800,0x07E0,0x001F):
+                    fg = color & mask
+                    bg = background & mask
+                    value |= (bg + (fg - bg) * level // top) & mask
+                palette.append(value.to_bytes(2,"big"))
+            self._palettes[key] = palette
+        return palette
+    
+    def decode(self,c,data,palette=None):
+        """Return the RGB565 data for char c from its encoded data.
+        A mask needs the palette for the color to draw it in"""
+        w, h = self.table[c][:2]
+        out = bytearray(w * h * 2)
+        palette = palette or self.palette
+        pos = 0
+        for i in range(0,len(data),2):
+            count = data[i] + 1
+            out[pos:pos + count * 2] = palette[data[i + 1]] * count
+            pos += count * 2
+        return out
+    
+    def close(self):
+        self._f.close()
+        
+        
+# atlases opened so far keyed by glyph set path.
+# None means there is no atlas for that path.
+_atlases = {}
+
+def get_atlas(path):
+    """Return the Atlas for the glyph set at path or None"""
+    if path not in _atlases:
+        try:
+            _atlases[path] = Atlas(path + ATLAS_NAME)
+        except OSError:
+            _atlases[path] = None
+        except ValueError as e:
+            print(str(e))
+            _atlases[path] = None
+            
+    return _atlases[path]
+
+
+class Glyph_Cache:
+    """A least recently used cache of RGB565 glyph buffers.
+    
+    Buffers are keyed by the image path so each size/colour set
+    (78/, 60/, 37/ etc.) gets its own entries. The total size of
+    the buffers held is kept under budget bytes. Set budget to 0 to
+    disable caching.
+    
+    A buffer bigger than budget / MIN_ENTRIES is never kept: a few of
+    them would push out everything else on the screen. Metrics.draw
+    streams glyphs that big from flash instead of loading them (see
+    keeps()).
+    """
+    
+    MIN_ENTRIES = 8
+    
+    def __init__(self,budget=32768):
+        self.budget = budget
+        self._cache = OrderedDict()
+        self.resident = 0 # bytes currently held
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.streamed = 0 # glyphs drawn straight from flash
+        
+    def keeps(self,size):
+        """True if a buffer of size bytes would be kept"""
+        return size <= self.budget // self.MIN_ENTRIES
+        
+    def get(self,key,loader,*args):
+        """Return the buffer for key. On a miss call loader(*args)
+        to read it and keep the result if it fits in the budget"""
+        
+        buf = self._cache.pop(key,None)
+        if buf is not None:
+            self.hits += 1
+            self._cache[key] = buf # move to the most recently used end
+            return buf
+        
+        self.misses += 1
+        try:
+            buf = loader(*args)
+        except MemoryError:
+            # give back what we are holding and try once more
+            self.clear()
+            buf = loader(*args)
+            
+        size = len(buf)
+        if self.keeps(size):
+            while self._cache and self.resident + size > self.budget:
+                self._evict()
+            self._cache[key] = buf
+            self.resident += size
+            
+        return buf
+    
+    def set_budget(self,budget):
+        """Change the budget, evicting as needed to fit"""
+        self.budget = budget
+        while self._cache and self.resident > self.budget:
+            self._evict()
+            
+    def clear(self):
+        """Drop everything. Use when memory is tight"""
+        self._cache = OrderedDict()
+        self.resident = 0
+        
+    def stats(self):
+        return {'hits':self.hits,
+                'misses':self.misses,
+                'evictions':self.evictions,
+                'streamed':self.streamed,
+                'entries':len(self._cache),
+                'resident':self.resident,
+                'budget':self.budget,
+                }
+    
+    def _evict(self):
+        # the least recently used entry is at the front
+        key = next(iter(self._cache))
+        self.resident -= len(self._cache.pop(key))
+        self.evictions += 1
+        
+
+glyph_cache = Glyph_Cache()
+
+
 class Metrics:
     """This is the base class and should probobly not be called directly.
     inherit this into classes for specific image sets"""
     
     def __init__(self,path="/lib/display/images/"):
         self.path = path # full path to the directory containing the images. needs trailing /
+        self.base_path = path
+        
+        # color565 values to draw a mask atlas with. None for the mask's own color
+        self.color = None
+        self.background = 0
         
         self.WIDTH = 48
         self.HEIGHT = 80
@@ -22,6 +262,22 @@ class Metrics:
         self.ONE_WIDTH = 38
         self.SPACE_WIDTH = 24
                 
+    def set_color(self,color,name=None):
+        """Draw the glyphs in color (a color565 value).
+        
+        This needs a mask atlas in the glyph set directory. Without one
+        the images in the name/ sub directory (e.g. "blue") are used as
+        they are.
+        """
+        self.path = self.base_path
+        atlas = get_atlas(self.path)
+        if atlas and atlas.mask:
+            self.color = color
+        else:
+            self.color = None
+            if name:
+                self.path = self.base_path + name + "/"
+        
     def get(self,s):
         """Return a dict containing the full path to the image file
         and the width and height"""
@@ -34,26 +290,89 @@ class Metrics:
         if not isinstance(s,str) or len(s) != 1 or s[0] not in ["0","1","2","3","4","5","6","7","8","9",".","-",":"," ","?"]:
             print("Bad Char:",str(s))
             s="?"
+            
+        atlas = get_atlas(self.path)
+        if atlas and s in atlas.table:
+            # the atlas knows the actual size of each glyph
+            w, h = atlas.table[s][:2]
+            glyph = {"char":c,"path":self._file_path(s),"w":w,"h":h,"atlas":atlas,"key":s,}
+            if atlas.mask:
+                color = atlas.color if self.color is None else self.color
+                glyph["color"] = color
+                glyph["palette"] = atlas.palette_for(color,self.background)
+            return glyph
 
         if s == "1":
             w=self.ONE_WIDTH
         elif s ==".":
             w=self.DOT_WIDTH
-            s = "dot"
         elif s == "-":
             w=self.DASH_WIDTH
-            s="dash"
         elif s == ":":
             w=self.COLON_WIDTH
-            s="colon"
         elif s == " ":
             w=self.SPACE_WIDTH
-            s = "space"
-        elif s == "?":
-            s = "huh"
     
-        return {"char":c,"path":self.path + "digit_{}.raw".format(s),"w":w,"h":h,}
+        return {"char":c,"path":self._file_path(s),"w":w,"h":h,}
+    
+    def can_draw(self,chars):
+        """True if there is an image for each of chars"""
+        atlas = get_atlas(self.path)
+        for c in chars:
+            if atlas:
+                if c not in atlas.table:
+                    return False
+                continue
+            try:
+                os.stat(self._file_path(c))
+            except OSError:
+                return False
+        return True
+    
+    def _file_path(self,s):
+        # the digit_*.raw file for char s
+        s = {".":"dot","-":"dash",":":"colon"," ":"space","?":"huh"}.get(s,s)
+        return self.path + "digit_{}.raw".format(s)
         
+    def read(self,glyph):
+        """Read the RGB565 data for a glyph dict from flash"""
+        if glyph.get("atlas"):
+            return glyph["atlas"].read(glyph["key"])
+        
+        with open(glyph["path"],"rb") as f:
+            return f.read(glyph["w"] * glyph["h"] * 2)
+        
+    def image(self,glyph):
+        """Return the RGB565 data for a glyph dict as returned by get().
+        Served from RAM if the glyph has been drawn recently"""
+        atlas = glyph.get("atlas")
+        if atlas and atlas.encoded:
+            return atlas.decode(glyph["key"],self._encoded(glyph),glyph.get("palette"))
+        return glyph_cache.get(glyph["path"],self.read,glyph)
+    
+    def _encoded(self,glyph):
+        # the run length encoded data for a glyph in an encoded atlas
+        return glyph_cache.get(glyph["path"],glyph["atlas"].read_encoded,glyph["key"])
+    
+    def draw(self,display,glyph,x,y):
+        """Draw a glyph dict as returned by get() at native x,y.
+        Encoded glyphs are expanded on the way to the display"""
+        atlas = glyph.get("atlas")
+        if atlas and atlas.encoded:
+            palette = glyph.get("palette") or atlas.palette
+            display.draw_rle(self._encoded(glyph),palette,x,y,glyph["h"],glyph["w"])
+        elif glyph_cache.keeps(glyph["w"] * glyph["h"] * 2):
+            display.draw_sprite(self.image(glyph),x,y,glyph["h"],glyph["w"])
+        else:
+            # too big to cache; stream it through the display's chunk
+            # buffers rather than loading the whole image
+            glyph_cache.streamed += 1
+            if atlas:
+                offset = atlas.table[glyph["key"]][2]
+                display.draw_image(atlas.path,x,y,glyph["h"],glyph["w"],offset=offset)
+            else:
+                display.draw_image(glyph["path"],x,y,glyph["h"],glyph["w"])
+    
     def string_width(self,s):
         # return the length of string s when rendered with glyphs
         l = 0
@@ -0,0 +1,100 @@
+"""
+Retained mode drawing for strings of glyphs.
+
+A Glyph_Region remembers what it last put on the screen so that
+redrawing a value only sends the glyphs that actually changed plus a
+background fill for any part of the old string that is no longer covered.
+"""
+
+
+class Glyph_Region:
+    """An area of the display that shows a string of glyphs.
+
+    Coordinates are native (portrait). The last character sits at
+    native y and each one before it at a higher y so the string reads
+    left to right in landscape.
+
+    Params:
+        display: Display obj
+        background: int: color565 value used to fill freed space
+
+    Properties:
+        value: str: the string currently on screen or None
+        glyphs_drawn: int: count of glyphs sent to the display
+        glyphs_skipped: int: count of glyphs that were already on screen
+    """
+
+    def __init__(self,display,background=0):
+        self.display = display
+        self.background = background
+        self.value = None
+        self._cells = [] # (x, y, w, h, path, color) for each glyph on screen
+        self.glyphs_drawn = 0
+        self.glyphs_skipped = 0
+
+    @property
+    def width(self):
+        """The length of the string on screen in pixels"""
+        return sum(cell[2] for cell in self._cells)
+
+    def invalidate(self):
+        """Forget what is on screen. Use after the display has been cleared
+        so the next draw sends everything"""
+        self.value = None
+        self._cells = []
+
+    def clear(self):
+        """Fill the area used by the current string with background"""
+        for cell in self._cells:
+            x, y, w, h = cell[:4]
+            self.display.fill_rectangle(x,y,h,w,self.background)
+        self.invalidate()
+
+    def draw(self,glyphs,x,y,value):
+        """Show value with its right hand end at native x,y.
+
+        glyphs is the glyph_metrics.Metrics obj to draw with
+        """
+
+        cells = []
+        images = {}
+        for i in range(len(value)-1,-1,-1):
+            glyph = glyphs.get(value[i])
+            cells.append((x,y,glyph["w"],glyph["h"],glyph["path"],glyph.get("color")))
+            images[glyph["path"]] = glyph
+            y += glyph["w"]
+
+        if not cells:
+            self.clear()
+            return
+
+        old = self._cells
+        if old and (old[0][0] != x or old[0][3] != cells[0][3]):
+            # moved or changed size; start over
+            self.clear()
+            old = []
+
+        on_screen = set(old)
+        for cell in cells:
+            if cell in on_screen:
+                self.glyphs_skipped += 1
+                continue
+            glyph = images[cell[4]]
+            glyphs.draw(self.display,glyph,x,cell[1])
+            self.glyphs_drawn += 1
+
+        if old:
+            # fill in any of the old string that sticks out past the new one
+            old_start = old[0][1]
+            old_end = old[-1][1] + old[-1][2]
+            new_start = cells[0][1]
+            new_end = cells[-1][1] + cells[-1][2]
+            h = old[0][3]
+            if old_start < new_start:
+                self.display.fill_rectangle(x,old_start,h,min(new_start,old_end) - old_start,self.background)
+            if old_end > new_end:
+                start = max(new_end,old_start)
+                self.display.fill_rectangle(x,start,h,old_end - start,self.background)
+
+        self._cells = cells
+        self.value = value
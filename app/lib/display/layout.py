@@ -0,0 +1,201 @@
+"""
+Where things go on the weather station screen.
+
+A Layout divides the landscape screen in to horizontal bands, one for
+the clock (if shown) and one for each sensor, and works out the native
+coordinates of everything drawn in them along with the glyph set each
+one uses. Layouts are made once per style and kept (see get_layout) so
+the display loop only has to look the positions up.
+
+When a band is too small for any glyph set that can draw a temperature
+(more than 3 sensors, or 3 and the clock) the temperature is drawn in
+the body font instead. If there are more sensors than even that leaves
+room for, only the first ones get a row and fits is False.
+
+All coordinates are native (portrait). In landscape native x runs down
+the screen and native y runs from the right hand edge (0) to the left
+(MAX_Y).
+"""
+
+from display import glyph_metrics
+
+LEFT = "left"
+CENTER = "center"
+RIGHT = "right"
+
+# The glyph sets to choose from, largest first
+GLYPH_SETS = (glyph_metrics.Metrics_78,glyph_metrics.Metrics_37,glyph_metrics.Metrics_27)
+
+# characters each kind of region has to be able to draw
+TEMP_CHARS = "0123456789.-"
+HILO_CHARS = "0123456789"
+TIME_CHARS = "0123456789: "
+
+PAD = 6 # space between the text and the left and right edges of the screen
+LABEL_HEIGHT = 30 # room for the sensor name above the high and low temps
+TEXT_PAD = 2 # space above a row drawn in the body font
+
+
+class Region:
+    """A strip of one band that a string of glyphs is drawn in.
+
+    Params:
+        x: int: native x of the top of the region
+        y: int: native y of the right hand end
+        w: int: the length of the region (native y span)
+        glyphs: glyph_metrics.Metrics obj to draw with or None to use
+            the display's body font
+        align: LEFT, CENTER or RIGHT
+    """
+
+    def __init__(self,x,y,w,glyphs,align=RIGHT):
+        self.x = x
+        self.y = y
+        self.w = w
+        self.glyphs = glyphs
+        self.align = align
+
+    def place(self,width):
+        """Return the native y of the right hand end of a string
+        width pixels long"""
+        if self.align == RIGHT:
+            return self.y
+        if self.align == CENTER:
+            return self.y + int((self.w - width) / 2)
+        return self.y + self.w - width
+
+
+class Sensor_Row:
+    """Everything drawn for one sensor.
+
+    Properties:
+        x: int: native x of the top of the row
+        h: int: height of the row (the tallest glyphs)
+        y: int: native y of the right hand end of the row
+        w: int: length of the row
+        label: (x, y): native position to draw the sensor name
+        temp: Region: the current temperature. Its glyphs are None when
+            it is drawn in the body font
+        low: Region: the low temperature. None if there is no room. The
+            high temperature is drawn to the right of it.
+        wide_glyphs: Metrics obj for the high and low when they need 3 digits
+        detail: (x, y): native position of a line of body font text below
+            everything else, e.g. the pressure. None if there is no room.
+        detail_chars: int: the most characters that fit on the detail line
+    """
+
+    def __init__(self,display,x,h,y,temp_glyphs,hilo_glyphs,wide_glyphs,bottom=None):
+        self.x = x
+        self.h = h
+        self.y = y
+        self.w = display.MAX_Y - y
+        self.label = (x,display.MAX_Y - PAD)
+        self.temp = Region(x,y + PAD,self.w - PAD,temp_glyphs,RIGHT)
+        self.low = None
+        self.wide_glyphs = None
+        if hilo_glyphs:
+            self.low = Region(x + LABEL_HEIGHT,y,self.w - PAD,hilo_glyphs,LEFT)
+            self.wide_glyphs = wide_glyphs or hilo_glyphs
+        # under the temp and the high and low, if it fits above bottom
+        self.detail = None
+        self.detail_chars = 0
+        top = x + max(h,LABEL_HEIGHT + (hilo_glyphs.HEIGHT if hilo_glyphs else 0)) + 1
+        if bottom is not None and top + display.body_font_height <= bottom:
+            self.detail = (top,display.MAX_Y - PAD)
+            self.detail_chars = (self.w - PAD * 2) // (display.body_font_width + display.body_font_spacing)
+
+
+class Layout:
+    """Positions for one screen style.
+
+    Params:
+        display: Display obj
+        sensors: int: number of sensor rows
+        show_time: bool: give the top band to the clock
+        strip: int: width of the trend strip at the right hand edge
+
+    Properties:
+        time: Region or None
+        rows: list of Sensor_Row. Fewer than sensors if they don't all fit
+        dividers: list of native x to draw lines across the screen at
+        fits: bool: False if the clock is taller than its band or some
+            sensors have no row
+    """
+
+    def __init__(self,display,sensors,show_time=False,strip=0):
+        self.display = display
+        self.strip = strip
+        self.time = None
+        self.rows = []
+        self.dividers = []
+        self.fits = True
+
+        # the smallest band a row drawn in the body font fits in
+        most = display.MAX_X // (display.body_font_height + TEXT_PAD)
+        sensors = max(sensors,1)
+        if sensors + (1 if show_time else 0) > most:
+            self.fits = False
+            sensors = most - (1 if show_time else 0)
+        bands = sensors + (1 if show_time else 0)
+        starts = [int(display.MAX_X * i / bands) for i in range(bands)] + [display.MAX_X]
+        self.dividers = starts[1:-1]
+
+        for i in range(bands):
+            top = starts[i]
+            size = starts[i + 1] - top
+            if show_time and i == 0:
+                glyphs = self._choose(size,TIME_CHARS)
+                self.time = Region(top,strip,display.MAX_Y - strip,glyphs,CENTER)
+                continue
+
+            temp_glyphs = self._choose(size,TEMP_CHARS,False)
+            if temp_glyphs:
+                temp_height = temp_glyphs.HEIGHT
+                # spare room goes above the row, up to 15px
+                pad = max(0,min(15,size - temp_height))
+            else:
+                # beside the name in the body font
+                temp_height = display.body_font_height
+                pad = TEXT_PAD
+            hilo_glyphs = self._choose(size - pad - LABEL_HEIGHT,HILO_CHARS,False)
+            wide_glyphs = None
+            if hilo_glyphs:
+                wide_glyphs = self._choose(hilo_glyphs.HEIGHT - 1,HILO_CHARS,False)
+            self.rows.append(
+                Sensor_Row(display,top + pad,temp_height,strip,
+                           temp_glyphs,hilo_glyphs,wide_glyphs,top + size)
+                )
+
+    def _choose(self,size,chars,required=True):
+        """Return the largest glyph set no taller than size that can draw
+        chars. If none fit return the smallest that can, or None if not
+        required"""
+        usable = None
+        for cls in GLYPH_SETS:
+            glyphs = cls()
+            if not glyphs.can_draw(chars):
+                continue
+            if glyphs.HEIGHT <= size:
+                return glyphs
+            usable = glyphs
+        if required:
+            self.fits = False
+            return usable
+        return None
+
+    @property
+    def strip_series(self):
+        """(x, h) of the trend strip band for each row"""
+        return [(row.x + 2,row.h - 4) for row in self.rows]
+
+
+# layouts made so far
+_layouts = {}
+
+def get_layout(display,sensors,show_time=False,strip=0):
+    """Return the Layout for these settings, made the first time only"""
+    key = (sensors,show_time,strip)
+    layout = _layouts.get(key)
+    if layout is None:
+        layout = _layouts[key] = Layout(display,sensors,show_time,strip)
+    return layout
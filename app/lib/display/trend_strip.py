@@ -0,0 +1,137 @@
+"""
+A scrolling graph of recent readings.
+
+The strip uses the ILI9341 hardware vertical scroll. In landscape the
+native rows become columns, so the strip is a band at the right hand edge
+of the screen (native y 0 to width-1) and each new sample is one native
+row. Adding a sample writes that single row and moves the scroll start
+address so the newest sample is always at the right and the older ones
+step to the left.
+"""
+
+
+class Trend_Strip:
+    """A band of the display that graphs one column per sample.
+
+    Params:
+        display: Display obj
+        width: int: number of samples shown (native rows used)
+        background: int: color565 value for the empty parts of a column
+
+    Properties:
+        series: list of (x, h, color) tuples, one per value passed to add().
+            x and h are the native x and height of the band the series is
+            drawn in.
+        columns_drawn: int: count of columns sent to the display
+    """
+
+    def __init__(self,display,width,background=0):
+        self.display = display
+        self.width = width
+        self.background = background
+        self.series = []
+        self.columns_drawn = 0
+
+        # each column is a full native row
+        self._template = bytearray(background.to_bytes(2,'big') * display.width)
+        self._column = bytearray(len(self._template))
+        self._samples = [None] * width # indexed by memory row
+        self._pos = 0 # memory row of the newest sample
+        self._ranges = []
+
+        # everything below the strip stays put
+        self.display.set_scroll(0,display.height - width)
+        self.display.scroll(self._pos)
+
+    def set_series(self,series):
+        """Set the (x, h, color) bands to draw each value in and remove
+        any marks. The history is kept but the strip has to be redrawn."""
+        self.series = list(series)
+        self._template[:] = self.background.to_bytes(2,'big') * self.display.width
+        self._ranges = [None] * len(self.series)
+        self._rescale()
+
+    def mark(self,x,color):
+        """Draw native x in color on every column, e.g. to carry a
+        divider line across the strip"""
+        if 0 <= x < self.display.width:
+            self._template[x*2:x*2+2] = color.to_bytes(2,'big')
+
+    def add(self,values):
+        """Append a sample. values has one number (or None) per series."""
+        values = tuple(values)
+        self._pos = (self._pos - 1) % self.width
+        self._samples[self._pos] = values
+
+        for i in range(min(len(values),len(self._ranges))):
+            value = values[i]
+            rng = self._ranges[i]
+            if value is not None and (rng is None or not rng[0] <= value <= rng[1]):
+                # out of scale; start over with the new range
+                self._rescale()
+                self.redraw()
+                return
+
+        self.display.begin()
+        try:
+            self._draw_column(self._pos)
+            self.display.scroll(self._pos)
+        finally:
+            self.display.end()
+
+    def redraw(self):
+        """Send the whole strip. Use after the display has been cleared"""
+        self.display.begin()
+        try:
+            for row in range(self.width):
+                self._draw_column(row)
+            self.display.scroll(self._pos)
+        finally:
+            self.display.end()
+
+    def _rescale(self):
+        """Set the range of each series to fit the samples on hand"""
+        for i in range(len(self.series)):
+            values = [s[i] for s in self._samples if s and i < len(s) and s[i] is not None]
+            if values:
+                lo = min(values)
+                hi = max(values)
+                # leave some room so small changes don't force a redraw
+                pad = max((hi - lo) * .25,1)
+                self._ranges[i] = (lo - pad,hi + pad)
+            else:
+                self._ranges[i] = None
+
+    def _plot(self,i,value):
+        """The native x for value in series i or None"""
+        if value is None or self._ranges[i] is None:
+            return None
+        lo, hi = self._ranges[i]
+        x, h, color = self.series[i]
+        # higher values toward the top of the screen (lower native x)
+        return x + int((hi - value) * (h - 1) / (hi - lo))
+
+    def _draw_column(self,row):
+        """Build and send the column for memory row"""
+        col = self._column
+        col[:] = self._template
+        sample = self._samples[row]
+        older = (row + 1) % self.width
+        prev = None if older == self._pos else self._samples[older]
+        if sample:
+            for i in range(min(len(sample),len(self.series))):
+                x = self._plot(i,sample[i])
+                if x is None:
+                    continue
+                start = end = x
+                if prev and i < len(prev):
+                    # join to the sample before so the trace is a line
+                    px = self._plot(i,prev[i])
+                    if px is not None:
+                        start = min(x,px)
+                        end = max(x,px)
+                pixel = self.series[i][2].to_bytes(2,'big')
+                col[start*2:end*2+2] = pixel * (end - start + 1)
+
+        self.display.block(0,row,self.display.width - 1,row,col)
+        self.columns_drawn += 1
@@ -1,5 +1,8 @@
 """XGLCD Font Utility."""
 from math import ceil, floor
+from ustruct import unpack
+
+FONT_MAGIC = b'XGF1'
 
 
 class XglcdFont(object):
@@ -11,6 +14,8 @@ class XglcdFont(object):
         height: Pixel height of font
         start_letter: ASCII number of first letter
         height_bytes: How many bytes comprises letter height
+        widths: Pixel width of each letter, indexed from start_letter
+        cache_bytes: Limit for memory used by rendered letters (0 = off)
 
     Note:
         Font files can be generated with the free version of MikroElektronika
@@ -18,12 +23,17 @@ class XglcdFont(object):
         The font file must be in X-GLCD 'C' format.
         To save text files from this font creator program in Win7 or higher
         you must use XP compatibility mode or you can just use the clipboard.
+
+        If a compiled copy of the font (same name with a .xgf extension,
+        made with digits/font2bin.py) is next to the 'C' file it is loaded
+        instead, which is much faster.
     """
 
     # Dict to tranlate bitwise values to byte position
     BIT_POS = {1: 0, 2: 2, 4: 4, 8: 6, 16: 8, 32: 10, 64: 12, 128: 14, 256: 16}
 
-    def __init__(self, path, width, height, start_letter=32, letter_count=96):
+    def __init__(self, path, width, height, start_letter=32, letter_count=96,
+                 cache_bytes=0):
         """Constructor for X-GLCD Font object.
 
         Args:
@@ -32,6 +42,8 @@ class XglcdFont(object):
             height (int): Height in pixels of each letter
             start_letter (int): First ACII letter.  Default is 32.
             letter_count (int): Total number of letters.  Default is 96.
+            cache_bytes (int): Memory to use keeping rendered letters.
+                Default is 0 (render every time).
         """
         self.width = width
         self.height = height
@@ -39,7 +51,43 @@ class XglcdFont(object):
         self.letter_count = letter_count
         self.bytes_per_letter = (floor(
             (self.height - 1) / 8) + 1) * self.width + 1
-        self.__load_xglcd_font(path)
+        if not self.__load_binary_font(path[:path.rfind('.')] + '.xgf'):
+            self.__load_xglcd_font(path)
+        # The first byte of each letter is its width
+        self.widths = bytes(self.letters[i * self.bytes_per_letter]
+                            for i in range(self.letter_count))
+        # Rendered letters keyed by (letter, color, background, landscape)
+        self.cache_bytes = cache_bytes
+        self._cache = {}
+        self._cache_used = 0
+
+    def __load_binary_font(self, path):
+        """Load compiled font data with a single read.
+
+        Args:
+            path (string): Full path of .xgf font file.
+        Returns:
+            bool: False if there is no usable compiled font.
+        """
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return False
+        with f:
+            magic, width, height, start_letter, letter_count, \
+                bytes_per_letter = unpack('<4sBBBBH', f.read(10))
+            if (magic != FONT_MAGIC or width != self.width or
+                    height != self.height or
+                    start_letter != self.start_letter or
+                    letter_count != self.letter_count or
+                    bytes_per_letter != self.bytes_per_letter):
+                print('Font does not match, ignoring: ' + path)
+                return False
+            self.letters = bytearray(bytes_per_letter * letter_count)
+            if f.readinto(self.letters) != len(self.letters):
+                print('Font file is short, ignoring: ' + path)
+                return False
+        return True
 
     def __load_xglcd_font(self, path):
         """Load X-GLCD font data from text file.
@@ -77,9 +125,29 @@ class XglcdFont(object):
             yield self.BIT_POS[b]
             n ^= b
 
+    def clear_cache(self):
+        """Drop all rendered letters (e.g. when memory is low)."""
+        self._cache = {}
+        self._cache_used = 0
+
+    def prerender(self, text, color, background=0, landscape=False):
+        """Render the letters in text ahead of time.
+
+        Args:
+            text (string): Letters to render.
+            color (int): RGB565 color value.
+            background (int): RGB565 background color (default: black).
+            landscape (bool): Orientation (default: False = portrait)
+        """
+        for letter in text:
+            self.get_letter(letter, color, background, landscape)
+
     def get_letter(self, letter, color, background=0, landscape=False):
         """Convert letter byte data to pixels.
 
+        Letters are kept once rendered while they fit in cache_bytes.
+        The buffer returned may be shared so must not be changed.
+
         Args:
             letter (string): Letter to return (must exist within font).
             color (int): RGB565 color value.
@@ -89,6 +157,29 @@ class XglcdFont(object):
             (bytearray): Pixel data.
             (int, int): Letter width and height.
         """
+        if not self.cache_bytes:
+            return self._render_letter(letter, color, background, landscape)
+
+        key = (letter, color, background, landscape)
+        result = self._cache.get(key)
+        if result is None:
+            try:
+                result = self._render_letter(letter, color, background,
+                                             landscape)
+            except MemoryError:
+                self.clear_cache()
+                result = self._render_letter(letter, color, background,
+                                             landscape)
+            size = len(result[0])
+            if size and size <= self.cache_bytes:
+                if self._cache_used + size > self.cache_bytes:
+                    self.clear_cache()
+                self._cache[key] = result
+                self._cache_used += size
+        return result
+
+    def _render_letter(self, letter, color, background=0, landscape=False):
+        """Convert letter byte data to pixels. See get_letter."""
         # Get index of letter
         letter_ord = ord(letter) - self.start_letter
         # Confirm font contains letter
@@ -160,11 +251,9 @@ class XglcdFont(object):
         Returns:
             int: length of text
         """
-        length = 0
+        widths = self.widths
+        start_letter = self.start_letter
+        length = len(text) * spacing
         for letter in text:
-            # Get index of letter
-            letter_ord = ord(letter) - self.start_letter
-            offset = letter_ord * self.bytes_per_letter
-            # Add length of letter and spacing
-            length += self.letters[offset] + spacing
+            length += widths[ord(letter) - start_letter]
         return length
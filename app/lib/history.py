@@ -0,0 +1,105 @@
+"""
+Recent readings kept on the device.
+
+A History keeps one value every period_s for the last window_s seconds
+in a ring buffer. The slot about to be overwritten holds the value from
+window_s ago, so the change over the window (e.g. the 3 hour pressure
+tendency) is one subtraction each time a value is kept rather than a
+search through the history.
+
+A Sensor_History keeps a History for each channel of a sensor.
+"""
+
+from array import array
+import utime
+
+RISING = "rising"
+FALLING = "falling"
+STEADY = "steady"
+
+# a 3 hour pressure change smaller than this (Pa) is STEADY
+STEADY_PA = 100
+
+
+class History:
+    """One value per period_s for the last window_s seconds.
+
+    Properties:
+        change: int: the newest value less the one window_s before it.
+            None until the window has been filled.
+    """
+
+    def __init__(self,period_s=600,window_s=10800):
+        self.period_ms = int(period_s * 1000)
+        # a value at each end of the window
+        self.size = max(2,int(window_s // period_s) + 1)
+        self._values = array('i',bytes(4 * self.size))
+        self._pos = 0 # the next slot, which holds the oldest value
+        self._count = 0
+        self._due = None # ticks_ms when the next value is kept
+        self.change = None
+
+    def __len__(self):
+        return self._count
+
+    def add(self,value,ticks=None):
+        """Keep value if period_s has gone by since the last one.
+        Returns True if it was kept"""
+        if ticks is None:
+            ticks = utime.ticks_ms()
+        if self._due is not None and utime.ticks_diff(ticks,self._due) < 0:
+            return False
+        if self._due is None or utime.ticks_diff(ticks,self._due) >= self.period_ms:
+            # first value or fell behind; start the periods from now
+            self._due = ticks
+        self._due = utime.ticks_add(self._due,self.period_ms)
+
+        pos = self._pos
+        self._values[pos] = value
+        pos = (pos + 1) % self.size
+        self._pos = pos
+        if self._count < self.size:
+            self._count += 1
+        if self._count == self.size:
+            self.change = value - self._values[pos]
+        return True
+
+    @property
+    def latest(self):
+        if self._count == 0:
+            return None
+        return self._values[(self._pos - 1) % self.size]
+
+    def values(self):
+        """Return a list of the values, oldest first"""
+        start = (self._pos - self._count) % self.size
+        return [self._values[(start + n) % self.size] for n in range(self._count)]
+
+
+class Sensor_History:
+    """The temperature (hundredths of a deg C), pressure (Pa) and
+    humidity (hundredths of a %RH) of one sensor. See History"""
+
+    def __init__(self,period_s=600,window_s=10800,humidity=True):
+        self.temp = History(period_s,window_s)
+        self.pressure = History(period_s,window_s)
+        self.humidity = History(period_s,window_s) if humidity else None
+
+    def add(self,reading):
+        """Keep a bmx.Reading if it is due"""
+        if self.temp.add(reading.temp_c100,reading.ticks):
+            self.pressure.add(reading.pressure,reading.ticks)
+            if self.humidity is not None and reading.humidity is not None:
+                self.humidity.add(reading.humidity,reading.ticks)
+
+    def tendency(self,steady_pa=STEADY_PA):
+        """Return RISING, FALLING or STEADY from the change in pressure
+        over the window, or None if there isn't that much history yet"""
+        change = self.pressure.change
+        if change is None:
+            return None
+        if change >= steady_pa:
+            return RISING
+        if change <= -steady_pa:
+            return FALLING
+        return STEADY
@@ -2,7 +2,15 @@
 from time import sleep
 from math import cos, sin, pi, radians
 from sys import implementation
-import ustruct
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    ticks_us = None  # stats are kept without timings
+try:
+    import rp2
+    from machine import mem32
+except ImportError:
+    rp2 = None  # DMA image streaming is only available on the RP2040
 
 
 def color565(r, g, b):
@@ -81,6 +89,12 @@ class Display(object):
     ENABLE3G = const(0xF2)  # Enable 3 gamma control
     PUMPRC = const(0xF7)  # Pump ratio control
 
+    # RP2040 SPI data and status registers and the DMA transfer request
+    # for each SPI bus transmit FIFO
+    SPI_DR = {0: 0x4003C008, 1: 0x40040008}
+    SPI_SR = {0: 0x4003C00C, 1: 0x4004000C}
+    DREQ_SPI_TX = {0: 16, 1: 18}
+
     ROTATE = {
         0: 0x88,
         90: 0xE8,
@@ -127,6 +141,32 @@ class Display(object):
             self.reset = self.reset_mpy
             self.write_cmd = self.write_cmd_mpy
             self.write_data = self.write_data_mpy
+
+        # Preallocated command buffers and batch depth (see begin())
+        self._cmd_buf = bytearray(1)
+        self._window_buf = bytearray(4)
+        self._batch = 0
+        # Reusable solid color buffer for fills
+        self._fill_buf = None
+        self._fill_color = None
+
+        # draw_image streams through two reusable buffers and, if
+        # enable_dma() is called, sends one while reading the next
+        self.image_chunk_size = 2048
+        self._image_bufs = None
+        self._dma = None
+
+        # draw_text renders whole lines in to a reusable buffer and
+        # keeps a few of the lines it has drawn for repeated labels
+        self.line_buffer_size = 8192
+        self.line_cache_bytes = 12288
+        self._line_buf = None
+        self._line_cache = {}
+        self._line_cache_used = 0
+
+        # counts of what is sent, kept once enable_stats() is called
+        self._stats = None
+
         self.reset()
         # Send initialization commands
         self.write_cmd(self.SWRESET)  # Software reset
@@ -158,6 +198,49 @@ class Display(object):
         sleep(.1)
         self.clear()
 
+    def begin(self):
+        """Start a batch of writes.
+
+        CS stays asserted from here until the matching end() so a run of
+        window and data writes goes out as one transaction. Batches may
+        be nested; only the outermost end() releases CS.
+        """
+        if not self._batch:
+            self._select()
+            if self._stats is not None:
+                self._stats['transactions'] += 1
+        self._batch += 1
+
+    def end(self):
+        """Finish a batch of writes started with begin()."""
+        self._batch -= 1
+        if not self._batch:
+            self._deselect()
+
+    def set_window(self, x0, y0, x1, y1):
+        """Set the display area that following data writes fill.
+
+        Args:
+            x0 (int):  Starting X position.
+            y0 (int):  Starting Y position.
+            x1 (int):  Ending X position.
+            y1 (int):  Ending Y position.
+        """
+        buf = self._window_buf
+        buf[0] = x0 >> 8
+        buf[1] = x0 & 0xFF
+        buf[2] = x1 >> 8
+        buf[3] = x1 & 0xFF
+        self.write_cmd(self.SET_COLUMN)
+        self.write_data(buf)
+        buf[0] = y0 >> 8
+        buf[1] = y0 & 0xFF
+        buf[2] = y1 >> 8
+        buf[3] = y1 & 0xFF
+        self.write_cmd(self.SET_PAGE)
+        self.write_data(buf)
+        self.write_cmd(self.WRITE_RAM)
+
     def block(self, x0, y0, x1, y1, data):
         """Write a block of data to display.
 
@@ -168,11 +251,105 @@ class Display(object):
             y1 (int):  Ending Y position.
             data (bytes): Data buffer to write.
         """
-        self.write_cmd(self.SET_COLUMN, *ustruct.pack(">HH", x0, x1))
-        self.write_cmd(self.SET_PAGE, *ustruct.pack(">HH", y0, y1))
+        stats = self._stats
+        if stats is not None:
+            stats['blocks'] += 1
+            if ticks_us:
+                start = ticks_us()
+        self.begin()
+        try:
+            self.set_window(x0, y0, x1, y1)
+            self.write_data(data)
+        finally:
+            self.end()
+        if stats is not None and ticks_us:
+            stats['block_us'] += ticks_diff(ticks_us(), start)
+
+    def enable_stats(self, enable=True):
+        """Start (or stop) counting what is sent to the display.
+
+        When enabled write_cmd and write_data are wrapped to count bytes
+        and calls and to time the writes. Nothing extra is done when
+        stats are off. See stats().
 
-        self.write_cmd(self.WRITE_RAM)
-        self.write_data(data)
+        Args:
+            enable (bool): True to keep stats, False to stop.
+        """
+        if enable and self._stats is None:
+            self._write_cmd = self.write_cmd
+            self._write_data = self.write_data
+            self.write_cmd = self._counted_write_cmd
+            self.write_data = self._counted_write_data
+            self._stats = {}
+            self.reset_stats()
+        elif not enable and self._stats is not None:
+            self.write_cmd = self._write_cmd
+            self.write_data = self._write_data
+            self._stats = None
+
+    def reset_stats(self):
+        """Zero the stats, e.g. at the start of a frame."""
+        if self._stats is not None:
+            self._stats = {
+                'bytes': 0,  # data bytes, not counting commands
+                'writes': 0,  # write_data calls
+                'commands': 0,
+                'blocks': 0,  # block calls
+                'transactions': 0,  # times CS was asserted for a batch
+                'write_us': 0,  # time spent in write_data
+                'block_us': 0,  # time spent in block, including writes
+            }
+
+    def stats(self):
+        """Return a copy of the stats dict or None if not enabled."""
+        if self._stats is None:
+            return None
+        return dict(self._stats)
+
+    def _counted_write_cmd(self, command, *args):
+        self._stats['commands'] += 1
+        self._write_cmd(command, *args)
+
+    def _counted_write_data(self, data):
+        stats = self._stats
+        stats['writes'] += 1
+        stats['bytes'] += len(data)
+        if ticks_us:
+            start = ticks_us()
+            self._write_data(data)
+            stats['write_us'] += ticks_diff(ticks_us(), start)
+        else:
+            self._write_data(data)
+
+    def _fill_window(self, x0, y0, x1, y1, color, chunk_size=1024):
+        """Fill a display area with a solid color.
+
+        The window is set once and the color is streamed in chunks.
+
+        Args:
+            x0, y0, x1, y1 (int): Display area.
+            color (int): RGB565 color value.
+            chunk_size (int): Bytes to send per data write.
+        """
+        size = (x1 - x0 + 1) * (y1 - y0 + 1) * 2
+        chunk_size = min(chunk_size, size)
+        buf = self._fill_buf
+        if (buf is None or self._fill_color != color or
+                len(buf) < chunk_size):
+            buf = bytearray(color.to_bytes(2, 'big') * (chunk_size // 2))
+            self._fill_buf = buf
+            self._fill_color = color
+        buf = memoryview(buf)
+        chunk_count, remainder = divmod(size, len(buf))
+        self.begin()
+        try:
+            self.set_window(x0, y0, x1, y1)
+            for c in range(chunk_count):
+                self.write_data(buf)
+            if remainder:
+                self.write_data(buf[:remainder])
+        finally:
+            self.end()
 
     def cleanup(self):
         """Clean up resources."""
@@ -189,13 +366,8 @@ class Display(object):
         """
         w = self.width
         h = self.height
-        # Clear display in 1024 byte blocks
-        if color:
-            line = color.to_bytes(2, 'big') * (w * 8)
-        else:
-            line = bytearray(w * 16)
-        for y in range(0, h, 8):
-            self.block(0, y, w - 1, y + 7, line)
+        # Clear display in 8 line chunks
+        self._fill_window(0, 0, w - 1, h - 1, color, w * 16)
 
     def display_off(self):
         """Turn display off."""
@@ -313,37 +485,175 @@ class Display(object):
         line = color.to_bytes(2, 'big') * w
         self.block(x, y, x + w - 1, y, line)
 
-    def draw_image(self, path, x=0, y=0, w=320, h=240):
+    def draw_image(self, path, x=0, y=0, w=320, h=240, chunk_size=None,
+                   offset=0):
         """Draw image from flash.
 
+        The image is read in to two reusable chunk buffers in turn. With
+        DMA enabled the next chunk is read while the last one is sent.
+
         Args:
             path (string): Image file path.
             x (int): X coordinate of image left.  Default is 0.
             y (int): Y coordinate of image top.  Default is 0.
             w (int): Width of image.  Default is 320.
             h (int): Height of image.  Default is 240.
+            chunk_size (int): Bytes per read.  Default is image_chunk_size.
+            offset (int): Where the image starts in the file.  Default is 0.
         """
         x2 = x + w - 1
         y2 = y + h - 1
         if self.is_off_grid(x, y, x2, y2):
             return
+        chunk_size = (chunk_size or self.image_chunk_size) & ~1
+        bufs = self._get_image_bufs(chunk_size)
+        remaining = w * h * 2
         with open(path, "rb") as f:
-            chunk_height = 1024 // w
-            chunk_count, remainder = divmod(h, chunk_height)
-            chunk_size = chunk_height * w * 2
-            chunk_y = y
-            if chunk_count:
-                for c in range(0, chunk_count):
-                    buf = f.read(chunk_size)
-                    self.block(x, chunk_y,
-                               x2, chunk_y + chunk_height - 1,
-                               buf)
-                    chunk_y += chunk_height
-            if remainder:
-                buf = f.read(remainder * w * 2)
-                self.block(x, chunk_y,
-                           x2, chunk_y + remainder - 1,
-                           buf)
+            if offset:
+                f.seek(offset)
+            # The whole image is one window, just stream the chunks to it
+            self.begin()
+            try:
+                self.set_window(x, y, x2, y2)
+                buf, next_buf = bufs
+                count = f.readinto(buf[:min(chunk_size, remaining)])
+                while count:
+                    remaining -= count
+                    self._start_data(buf[:count])
+                    # Overlaps the transfer when it is done by DMA
+                    count = 0
+                    if remaining:
+                        count = f.readinto(
+                            next_buf[:min(chunk_size, remaining)])
+                    self._wait_data()
+                    buf, next_buf = next_buf, buf
+            finally:
+                self._wait_data()
+                self.end()
+
+    def draw_rle(self, data, palette, x, y, w, h, chunk_size=None):
+        """Draw a run length encoded, palette indexed image.
+
+        The runs are expanded in place in to the same reusable chunk
+        buffers as draw_image so neither the whole RGB565 image nor a
+        run of it is ever allocated. With DMA enabled the next chunk is
+        expanded while the last one is sent.
+
+        Args:
+            data (bytes): Pairs of run length - 1 and palette index.
+            palette (list): 2 byte big endian RGB565 color for each index.
+            x (int): Starting X position.
+            y (int): Starting Y position.
+            w (int): Width of image.
+            h (int): Height of image.
+            chunk_size (int): Bytes per write.  Default is image_chunk_size.
+        """
+        x2 = x + w - 1
+        y2 = y + h - 1
+        if self.is_off_grid(x, y, x2, y2):
+            return
+        chunk_size = (chunk_size or self.image_chunk_size) & ~1
+        buf, next_buf = self._get_image_bufs(chunk_size)
+        pos = 0
+        self.begin()
+        try:
+            self.set_window(x, y, x2, y2)
+            for i in range(0, len(data), 2):
+                count = data[i] + 1
+                color = palette[data[i + 1]]
+                while count:
+                    n = min(count, (chunk_size - pos) >> 1) * 2
+                    # fill the run in place rather than making color * n:
+                    # one pixel, then double what is there until it is full
+                    buf[pos] = color[0]
+                    buf[pos + 1] = color[1]
+                    done = 2
+                    while done < n:
+                        step = min(done, n - done)
+                        buf[pos + done:pos + done + step] = buf[pos:pos + step]
+                        done += step
+                    pos += n
+                    count -= n >> 1
+                    if pos == chunk_size:
+                        self._wait_data()
+                        self._start_data(buf)
+                        buf, next_buf = next_buf, buf
+                        pos = 0
+            if pos:
+                self._wait_data()
+                self._start_data(buf[:pos])
+        finally:
+            self._wait_data()
+            self.end()
+
+    def _get_image_bufs(self, chunk_size):
+        """Return the pair of chunk buffers, sized to chunk_size."""
+        bufs = self._image_bufs
+        if bufs is None or len(bufs[0]) != chunk_size:
+            bufs = self._image_bufs = (memoryview(bytearray(chunk_size)),
+                                       memoryview(bytearray(chunk_size)))
+        return bufs
+
+    def enable_dma(self, spi_id):
+        """Use DMA to send image data so draw_image can read ahead.
+
+        Only available on the RP2040 with a MicroPython that has rp2.DMA.
+        The register addresses are the RP2040's, so on any other chip
+        (e.g. the RP2350, which also has rp2.DMA) image data is sent with
+        blocking SPI writes.
+
+        Args:
+            spi_id (int): Hardware SPI bus the display is on (0 or 1).
+        Returns:
+            boolean: True if DMA will be used.
+        """
+        if rp2 is None or not hasattr(rp2, 'DMA') or \
+                spi_id not in self.SPI_DR:
+            return False
+        if 'RP2040' not in getattr(implementation, '_machine', ''):
+            return False
+        try:
+            dma = rp2.DMA()
+        except Exception:
+            # No free DMA channels
+            return False
+        self._dma = dma
+        self._dma_dr = self.SPI_DR[spi_id]
+        self._dma_sr = self.SPI_SR[spi_id]
+        self._dma_ctrl = dma.pack_ctrl(size=0, inc_write=False,
+                                       treq_sel=self.DREQ_SPI_TX[spi_id])
+        self._dma_busy = False
+        return True
+
+    def _start_data(self, data):
+        """Start sending data. Must be followed by _wait_data()."""
+        if self._dma is None:
+            self.write_data(data)
+            return
+        if self._stats is not None:
+            self._stats['writes'] += 1
+            self._stats['bytes'] += len(data)
+        self.dc(1)
+        if not self._batch:
+            self.cs(0)
+        self._dma.config(read=data, write=self._dma_dr, count=len(data),
+                         ctrl=self._dma_ctrl, trigger=True)
+        self._dma_busy = True
+
+    def _wait_data(self):
+        """Wait for data started with _start_data() to be sent."""
+        if self._dma is None or not self._dma_busy:
+            return
+        while self._dma.active():
+            pass
+        # Wait for the last bytes to shift out then empty the receive FIFO
+        while mem32[self._dma_sr] & 0x10:
+            pass
+        while mem32[self._dma_sr] & 0x04:
+            mem32[self._dma_dr]
+        self._dma_busy = False
+        if not self._batch:
+            self.cs(1)
 
     def draw_letter(self, x, y, letter, font, color, background=0,
                     landscape=False):
@@ -521,6 +831,10 @@ class Display(object):
                   landscape=False, spacing=1):
         """Draw text.
 
+        The letters and the spacing between them are rendered into one
+        buffer and sent to the display as a single block. Long text is
+        sent in as few blocks as will fit in line_buffer_size.
+
         Args:
             x (int): Starting X position.
             y (int): Starting Y position.
@@ -531,33 +845,126 @@ class Display(object):
             landscape (bool): Orientation (default: False = portrait)
             spacing (int): Pixels between letters (default: 1)
         """
-        for letter in text:
-            # Get letter array and letter dimensions
-            w, h = self.draw_letter(x, y, letter, font, color, background,
-                                    landscape)
-            # Stop on error
-            if w == 0 or h == 0:
-                print('Invalid width {0} or height {1}'.format(w, h))
-                return
+        key = (text, id(font), color, background, landscape, spacing)
+        line = self._line_cache.get(key)
+        if line is not None:
+            # Repeated text, already rendered
+            self._blit_line(x, y, line, len(line) // (font.height * 2),
+                            font.height, landscape)
+            return
 
-            if landscape:
-                # Fill in spacing
-                if spacing:
-                    self.fill_hrect(x, y - w - spacing, h, spacing, background)
-                # Position y for next letter
-                y -= (w + spacing)
-            else:
-                # Fill in spacing
+        self.begin()
+        try:
+            self._draw_text(x, y, text, font, color, background, landscape,
+                            spacing, key)
+        finally:
+            self.end()
+
+    def _draw_text(self, x, y, text, font, color, background, landscape,
+                   spacing, key):
+        """Draw text in line buffer sized blocks. See draw_text."""
+        # Letters per block are limited by the size of the line buffer
+        max_length = self.line_buffer_size // (font.height * 2)
+        # Room left before running off the display
+        room = y + 1 if landscape else self.width - x
+        start = 0
+        length = 0
+        for i in range(len(text)):
+            letter_ord = ord(text[i]) - font.start_letter
+            if letter_ord < 0 or letter_ord >= font.letter_count:
+                # Stop on error
+                print('Font does not contain character: ' + text[i])
+                text = text[:i]
+                key = None
+                break
+            w = font.measure_text(text[i], spacing)
+            if w > room:
+                # Draw the letters that fit
+                print('Text runs off display at: ' + text[i])
+                text = text[:i]
+                key = None
+                break
+            room -= w
+            if length + w > max_length and i > start:
+                x, y = self._draw_line(x, y, text[start:i], font, color,
+                                       background, landscape, spacing)
+                start = i
+                length = 0
+            length += w
+        if start == len(text):
+            return
+
+        self._draw_line(x, y, text[start:], font, color, background,
+                        landscape, spacing, key if start == 0 else None)
+
+    def _draw_line(self, x, y, text, font, color, background, landscape,
+                   spacing, cache_key=None):
+        """Render text in to the line buffer and send it as one block.
+
+        Returns:
+            (int, int): X, Y position for the text that follows.
+        """
+        h = font.height
+        length = font.measure_text(text, spacing)
+        size = length * h * 2
+        if self._line_buf is None or len(self._line_buf) < size:
+            self._line_buf = bytearray(max(size, self.line_buffer_size))
+        buf = memoryview(self._line_buf)
+        gap = background.to_bytes(2, 'big') * (spacing * h)
+
+        if landscape:
+            # Letters run toward y = 0 so the first letter goes at the end
+            # of the buffer and each one after it (and its spacing) before
+            pos = size
+            for letter in text:
+                letter_buf, w, _ = font.get_letter(letter, color, background,
+                                                   landscape)
+                n = len(letter_buf)
+                buf[pos - n:pos] = letter_buf
+                pos -= n
                 if spacing:
-                    self.fill_hrect(x + w, y, spacing, h, background)
-                # Position x for next letter
-                x += (w + spacing)
+                    buf[pos - len(gap):pos] = gap
+                    pos -= len(gap)
+        else:
+            # Copy each row of each letter across the full line
+            row_bytes = length * 2
+            row_gap = gap[:spacing * 2]
+            offset = 0
+            for letter in text:
+                letter_buf, w, _ = font.get_letter(letter, color, background,
+                                                   landscape)
+                w2 = w * 2
+                for row in range(h):
+                    pos = row * row_bytes + offset
+                    buf[pos:pos + w2] = letter_buf[row * w2:(row + 1) * w2]
+                    if spacing:
+                        buf[pos + w2:pos + w2 + spacing * 2] = row_gap
+                offset += w2 + spacing * 2
+
+        line = buf[:size]
+        self._blit_line(x, y, line, length, h, landscape)
+
+        if cache_key and size <= self.line_cache_bytes:
+            if self._line_cache_used + size > self.line_cache_bytes:
+                self._line_cache = {}
+                self._line_cache_used = 0
+            self._line_cache[cache_key] = bytes(line)
+            self._line_cache_used += size
 
-                # # Fill in spacing
-                # if spacing:
-                #     self.fill_vrect(x + w, y, spacing, h, background)
-                # # Position x for next letter
-                # x += w + spacing
+        if landscape:
+            return x, y - length
+        return x + length, y
+
+    def _blit_line(self, x, y, buf, length, h, landscape):
+        """Send a rendered line of text to the display."""
+        if landscape:
+            if self.is_off_grid(x, y - length, x + h - 1, y - 1):
+                return
+            self.block(x, y - length, x + h - 1, y - 1, buf)
+        else:
+            if self.is_off_grid(x, y, x + length - 1, y + h - 1):
+                return
+            self.block(x, y, x + length - 1, y + h - 1, buf)
 
     def draw_vline(self, x, y, h, color):
         """Draw a vertical line.
@@ -666,23 +1073,7 @@ class Display(object):
         """
         if self.is_off_grid(x, y, x + w - 1, y + h - 1):
             return
-        chunk_height = 1024 // w
-        chunk_count, remainder = divmod(h, chunk_height)
-        chunk_size = chunk_height * w
-        chunk_y = y
-        if chunk_count:
-            buf = color.to_bytes(2, 'big') * chunk_size
-            for c in range(0, chunk_count):
-                self.block(x, chunk_y,
-                           x + w - 1, chunk_y + chunk_height - 1,
-                           buf)
-                chunk_y += chunk_height
-
-        if remainder:
-            buf = color.to_bytes(2, 'big') * remainder * w
-            self.block(x, chunk_y,
-                       x + w - 1, chunk_y + remainder - 1,
-                       buf)
+        self._fill_window(x, y, x + w - 1, y + h - 1, color)
 
     def fill_rectangle(self, x, y, w, h, color):
         """Draw a filled rectangle.
@@ -795,23 +1186,7 @@ class Display(object):
         """
         if self.is_off_grid(x, y, x + w - 1, y + h - 1):
             return
-        chunk_width = 1024 // h
-        chunk_count, remainder = divmod(w, chunk_width)
-        chunk_size = chunk_width * h
-        chunk_x = x
-        if chunk_count:
-            buf = color.to_bytes(2, 'big') * chunk_size
-            for c in range(0, chunk_count):
-                self.block(chunk_x, y,
-                           chunk_x + chunk_width - 1, y + h - 1,
-                           buf)
-                chunk_x += chunk_width
-
-        if remainder:
-            buf = color.to_bytes(2, 'big') * remainder * h
-            self.block(chunk_x, y,
-                       chunk_x + remainder - 1, y + h - 1,
-                       buf)
+        self._fill_window(x, y, x + w - 1, y + h - 1, color)
 
     def is_off_grid(self, xmin, ymin, xmax, ymax):
         """Check if coordinates extend past display boundaries.
@@ -891,7 +1266,6 @@ class Display(object):
         """
         if top + bottom <= self.height:
             middle = self.height - (top + bottom)
-            print(top, middle, bottom)
             self.write_cmd(self.VSCRDEF,
                            top >> 8,
                            top & 0xFF,
@@ -908,9 +1282,12 @@ class Display(object):
             *args (optional bytes): Data to transmit.
         """
         self.dc(0)
-        self.cs(0)
-        self.spi.write(bytearray([command]))
-        self.cs(1)
+        if not self._batch:
+            self.cs(0)
+        self._cmd_buf[0] = command
+        self.spi.write(self._cmd_buf)
+        if not self._batch:
+            self.cs(1)
         # Handle any passed data
         if len(args) > 0:
             self.write_data(bytearray(args))
@@ -927,9 +1304,11 @@ class Display(object):
         # Confirm SPI locked before writing
         while not self.spi.try_lock():
             pass
-        self.spi.write(bytearray([command]))
+        self._cmd_buf[0] = command
+        self.spi.write(self._cmd_buf)
         self.spi.unlock()
-        self.cs.value = True
+        if not self._batch:
+            self.cs.value = True
         # Handle any passed data
         if len(args) > 0:
             self.write_data(bytearray(args))
@@ -941,9 +1320,25 @@ class Display(object):
             data (bytes): Data to transmit.
         """
         self.dc(1)
-        self.cs(0)
+        if not self._batch:
+            self.cs(0)
         self.spi.write(data)
-        self.cs(1)
+        if not self._batch:
+            self.cs(1)
+
+    def _select(self):
+        """Assert CS."""
+        if implementation.name == 'circuitpython':
+            self.cs.value = False
+        else:
+            self.cs(0)
+
+    def _deselect(self):
+        """Release CS."""
+        if implementation.name == 'circuitpython':
+            self.cs.value = True
+        else:
+            self.cs(1)
 
     def write_data_cpy(self, data):
         """Write data to OLED (CircuitPython).
@@ -958,4 +1353,5 @@ class Display(object):
             pass
         self.spi.write(data)
         self.spi.unlock()
-        self.cs.value = True
+        if not self._batch:
+            self.cs.value = True
@@ -0,0 +1,162 @@
+"""
+Sample the sensors between display updates.
+
+Instead of one reading a minute, each sensor is read every interval_ms
+while the display loop waits. The temperatures (int hundredths of a deg
+C) go in to a ring buffer per sensor; once a minute the buffers are
+reduced to a Summary and the mean is what gets displayed and exported.
+
+The buffers are allocated up front and a sample only writes in to them,
+so sampling doesn't allocate and can't fragment the heap.
+"""
+
+from array import array
+from collections import namedtuple
+from bmx_registry import FAILED
+import utime
+
+# one sensor's samples since the last reduce(). All int hundredths of a
+# deg C except count
+Summary = namedtuple("Summary",("count","min","max","mean","stddev"))
+
+
+class Sampler:
+    """Read a Sensor_Registry every interval_ms.
+
+    Params:
+        sensors: Sensor_Registry
+        interval_ms: int: time between samples
+        size: int: samples kept per sensor. When more than this are taken
+            between reductions only the latest are used.
+
+    Properties:
+        samples_taken: int: count of sample() calls
+    """
+
+    def __init__(self,sensors,interval_ms=1000,size=60):
+        self.sensors = sensors
+        self.interval_ms = interval_ms
+        self.size = size
+        self.samples_taken = 0
+        count = len(sensors.sensors)
+        self._buffers = [array('h',bytes(2 * size)) for _ in range(count)]
+        self._pos = array('H',bytes(2 * count)) # next slot in each buffer
+        self._count = array('H',bytes(2 * count)) # samples since reduce
+        self._started = bytearray(count)
+        # sensor indexes a bus at a time
+        self._order = []
+        for bus in sensors.buses.values():
+            for sensor in bus:
+                self._order.append(sensors.sensors.index(sensor))
+
+    def sample(self):
+        """Take one temperature from each sensor. The conversions all
+        run at once. FAILED sensors are skipped until the registry
+        recovers them"""
+        registry = self.sensors
+        registry.recover()
+        sensors = registry.sensors
+        for i in self._order:
+            self._started[i] = 0
+            sensor = sensors[i]
+            if sensor.health.state == FAILED:
+                continue
+            try:
+                sensor.bmx.trigger()
+                self._started[i] = 1
+            except Exception as e:
+                registry.failed(sensor,e)
+
+        for i in self._order:
+            if not self._started[i]:
+                continue
+            sensor = sensors[i]
+            try:
+                bmx = sensor.bmx
+                bmx.collect()
+                pos = self._pos[i]
+                self._buffers[i][pos] = bmx.temperature_c100
+                self._pos[i] = (pos + 1) % self.size
+                if self._count[i] < self.size:
+                    self._count[i] += 1
+                registry.succeeded(sensor)
+            except Exception as e:
+                registry.failed(sensor,e)
+        self.samples_taken += 1
+
+    def run(self,seconds):
+        """Sample every interval_ms for seconds then return. Use in
+        place of time.sleep(seconds)"""
+        end = utime.ticks_add(utime.ticks_ms(),int(seconds * 1000))
+        due = utime.ticks_ms()
+        while utime.ticks_diff(end,utime.ticks_ms()) > 0:
+            if utime.ticks_diff(due,utime.ticks_ms()) <= 0:
+                self.sample()
+                due = utime.ticks_add(due,self.interval_ms)
+                if utime.ticks_diff(due,utime.ticks_ms()) <= 0:
+                    # fell behind; skip the missed samples
+                    due = utime.ticks_add(utime.ticks_ms(),self.interval_ms)
+            wait = min(utime.ticks_diff(due,utime.ticks_ms()),utime.ticks_diff(end,utime.ticks_ms()))
+            if wait > 0:
+                utime.sleep_ms(wait)
+
+    def summary(self,i):
+        """Return the Summary of sensor i's samples or None if there are
+        none"""
+        count = self._count[i]
+        if count == 0:
+            return None
+        buf = self._buffers[i]
+        # the newest count samples end just before _pos
+        start = (self._pos[i] - count) % self.size
+        lo = hi = buf[start]
+        total = 0
+        for n in range(count):
+            value = buf[(start + n) % self.size]
+            total += value
+            if value < lo:
+                lo = value
+            if value > hi:
+                hi = value
+        mean = _div_round(total,count)
+        spread = 0
+        for n in range(count):
+            diff = buf[(start + n) % self.size] - mean
+            spread += diff * diff
+        return Summary(count,lo,hi,mean,_isqrt(_div_round(spread,count)))
+
+    def reduce(self):
+        """Summarize each sensor's samples in to sensor.summary, make the
+        mean its current reading and start over. Returns True if there
+        were any samples"""
+        found = False
+        registry = self.sensors
+        for i in range(len(registry.sensors)):
+            sensor = registry.sensors[i]
+            summary = self.summary(i)
+            self._count[i] = 0
+            if summary is None or not sensor.connected:
+                # samples from before a sensor failed are dropped
+                continue
+            try:
+                sensor.set_summary(summary)
+                found = True
+            except Exception as e:
+                registry.failed(sensor,e)
+        return found
+
+
+def _div_round(a,b):
+    return (a + b // 2) // b
+
+
+def _isqrt(n):
+    """Integer square root"""
+    if n <= 0:
+        return 0
+    x = n
+    y = (x + 1) // 2
+    while y < x:
+        x = y
+        y = (x + n // x) // 2
+    return x
@@ -3,6 +3,7 @@ Moved here to help improve ota updates"""
 
 from machine import RTC
 import json
+import time
 import gc
 gc.enable()
 
@@ -13,6 +14,7 @@ from display.display import Display
 from logging import logging as log
 from settings.settings import settings
 from bmx import BMX
+from bmx_registry import Sensor_Registry, get_i2c
 
 
 def get_display():
@@ -21,25 +23,76 @@ def get_display():
     display.clear()
     
     display.centered_text("Starting up...",y=25,width=display.MAX_Y)
+    # ticks_ms() counts from power up
+    log.info(f'Boot to first frame: {time.ticks_ms()} ms')
     
     return display
 
 
 def get_sensors():
-        # create sensor instances
-        sensors = [] #make a list
+        """Return a Sensor_Registry of the sensors in settings.bmx_list"""
+        sensors = Sensor_Registry()
+        try:
+            mode = settings.bmx_mode
+            standby_ms = settings.bmx_standby_ms
+            iir = settings.bmx_iir
+        except AttributeError:
+            mode = "forced"
+            standby_ms = 1000
+            iir = 0
+        try:
+            cal_dir = settings.bmx_cal_dir
+        except AttributeError:
+            cal_dir = None
+        try:
+            cal_mode = settings.temp_calibration_mode
+        except AttributeError:
+            cal_mode = "linear"
+        try:
+            deadband = settings.temp_deadband
+            filter_alpha = settings.temp_filter_alpha
+            max_silent_s = settings.temp_max_silent_s
+        except AttributeError:
+            deadband = 0
+            filter_alpha = 1
+            max_silent_s = 0
+        try:
+            press_units = settings.pressure_units
+        except AttributeError:
+            press_units = "inhg"
+        try:
+            history_period_s = settings.history_period_s
+            history_window_s = settings.history_window_s
+        except AttributeError:
+            history_period_s = 600
+            history_window_s = 10800
         for sensor in settings.bmx_list:
             try:
                 s = BMX(
                         bus_id = sensor['bus_id'],
                         scl_pin = sensor['scl_pin'],
                         sda_pin = sensor['sda_pin'],
+                        address = sensor['address'],
+                        i2c = get_i2c(sensor['bus_id'],sensor['scl_pin'],sensor['sda_pin']),
                         name = sensor['name'],
                         sensor_id = sensor['sensor_id'],
                         temp_calibration_list = sensor['cal_data'],
                         temp_scale = sensor['scale'],
+                        cal_mode = cal_mode,
+                        mode = mode,
+                        standby_ms = standby_ms,
+                        iir = iir,
+                        cal_dir = cal_dir,
+                        deadband = deadband,
+                        filter_alpha = filter_alpha,
+                        max_silent_s = max_silent_s,
+                        press_units = press_units,
+                        history_period_s = history_period_s,
+                        history_window_s = history_window_s,
+                        probe = False, # the registry connects it
                         )
-                sensors.append(s)
+                # added even if it doesn't answer so it can be retried
+                sensors.add(s)
             except Exception as e:
                 mes = f"{sensor['name']} sensor Failed"
                 log.exception(e,f'{mes}')
@@ -62,14 +115,39 @@ def export_reading(sensor):
         gc.collect()
 
         try:
-            r = urequests.get("{url}/{sensor_id}/{temp}/{raw_temp}/{scale}/".format(
+            url = "{url}/{sensor_id}/{temp}/{raw_temp}/{scale}/".format(
                         url = settings.reading_export_url,
                         sensor_id=sensor.sensor_id,
                         temp=sensor.adjusted_temperature,
                         raw_temp = sensor.saved_temp,
                         scale=sensor.temp_scale,
                         )
-                    )
+            params = []
+            summary = sensor.summary
+            if summary:
+                # temp is the mean of these samples
+                scale = 9 / 5 if sensor.temp_scale == "f" else 1
+                params.append("min={}&max={}&stddev={}&count={}".format(
+                        sensor.display_c100(summary.min) / 100,
+                        sensor.display_c100(summary.max) / 100,
+                        round(summary.stddev * scale / 100,2),
+                        summary.count,
+                        ))
+            params.append("pressure={}&press_units={}".format(
+                    sensor.adjusted_pressure,
+                    sensor.press_units,
+                    ))
+            tendency = sensor.tendency
+            if tendency:
+                params.append("tendency={}&press_change={}".format(
+                        tendency,
+                        sensor.display_press100(sensor.history.pressure.change) / 100,
+                        ))
+            humidity = sensor.humidity
+            if humidity is not None:
+                params.append("humidity={}".format(round(humidity,1)))
+            url += "?" + "&".join(params)
+            r = urequests.get(url)
 
             log.debug(f"Response from data upload: {r.text}")
             if r.text.upper() != 'OK':
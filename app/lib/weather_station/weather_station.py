@@ -19,6 +19,11 @@ import json
 
 from display.display import Display, Button
 from display import glyph_metrics
+from display.glyph_region import Glyph_Region
+from display.trend_strip import Trend_Strip
+from sampler import Sampler
+from history import RISING, FALLING, STEADY
+from display.layout import get_layout
 from ntp_clock import Clock
 from wifi_connect import connection
 from ota_update.check_for_updates import Check_For_Updates
@@ -26,6 +31,9 @@ from weather_station import utils
 import gc
 gc.enable()
 
+# drawn after the pressure to show its tendency
+TENDENCY_MARKS = {RISING:"^",FALLING:"v",STEADY:"-"}
+
 class Weather_Station:
     
     def __init__(self,**kwargs):
@@ -43,6 +51,55 @@ class Weather_Station:
         
         self.display = utils.get_display()
         
+        # retained state of what is on screen for each display row
+        self.rows = {}
+        # names of the sensors shown as missing
+        self.missing = set()
+        self.time_region = Glyph_Region(self.display,self.display.BLACK)
+        
+        # RAM set aside for recently drawn glyph images
+        glyph_metrics.glyph_cache.set_budget(settings.glyph_cache_bytes)
+        
+        # colors for the low and high temperatures
+        try:
+            self.low_color = settings.low_temp_color
+        except AttributeError:
+            self.low_color = self.display.LOW_TEMP
+        try:
+            self.high_color = settings.high_temp_color
+        except AttributeError:
+            self.high_color = self.display.HIGH_TEMP
+        
+        # time spent on each part of the last pass of the display loop
+        # in micro seconds. See start()
+        self.stats = {}
+        try:
+            self.log_stats = settings.log_frame_stats
+        except AttributeError:
+            self.log_stats = False
+        try:
+            if settings.display_stats:
+                # count the bytes and time sent to the display as well
+                self.display.enable_stats()
+        except AttributeError:
+            pass
+        
+        # optional line of pressure and humidity under each sensor
+        try:
+            self.show_pressure = settings.show_pressure
+            self.show_humidity = settings.show_humidity
+        except AttributeError:
+            self.show_pressure = self.show_humidity = False
+        
+        # optional scrolling graph of recent temperatures
+        self.trend_strip = None
+        try:
+            strip_width = settings.trend_strip_width
+        except AttributeError:
+            strip_width = 0
+        if strip_width:
+            self.trend_strip = Trend_Strip(self.display,strip_width,self.display.BLACK)
+        
     def start(self):
         """Run the weather station display loop"""
         
@@ -78,9 +135,22 @@ class Weather_Station:
     
         sensors = utils.get_sensors() 
 
+        # read the sensors between updates and show the average
+        sampler = None
+        try:
+            interval = settings.sample_interval_ms
+            size = settings.sample_buffer_size
+        except AttributeError:
+            interval = 0
+        if interval > 0 and len(sensors):
+            sampler = Sampler(sensors,interval,size)
+
         while True:
+            self.stats = {"gc_us":0,"read_us":0,"hinlow_us":0,"render_us":0,"export_us":0}
+            self.display.reset_stats()
+            frame_start = lap = time.ticks_us()
             gc.collect()
-            glyphs = glyph_metrics.Metrics_78()
+            lap = self._lap("gc_us",lap)
             if not clk.has_time and clk.last_sync_seconds < time.time() - 60:
                 # if we just tryied to get the time and failed, don't try for a while
                 clk.set_time()
@@ -101,63 +171,96 @@ class Weather_Station:
 
             self.led.duty_u16(self.brightness)
             
+            lap = time.ticks_us()
             if style != prev_style:
                 prev_style = style
                 force_refresh = True
-                if clk.has_time:
-                    # divide screen into 3 regions
-                    # display_coords is a list of tuples that describe the native
-                    # coords of the regions to be used for each display row
-                    # as (x,y,h,w) 
-                    pad = (2,6) # (x,y)
-                    self.display_coords = [
-                        (0,pad[1],glyphs.HEIGHT,self.display.MAX_Y),
-                        (pad[0]+int(self.display.MAX_X*.333),pad[1],glyphs.HEIGHT,self.display.MAX_Y),
-                        (pad[0]+int(self.display.MAX_X*.666),pad[1],glyphs.HEIGHT,self.display.MAX_Y),
-                        ]
-                else:
-                    # divide screen into 2 regions
-                    pad = (15,6) # (x,y)
-                    self.display_coords = [
-                        (pad[0],pad[1],glyphs.HEIGHT,self.display.MAX_Y),
-                        (pad[0]+int(self.display.MAX_X*.5),pad[1],glyphs.HEIGHT,self.display.MAX_Y),
-                        ]
+                # the trend strip takes the right hand end of each row
+                strip = self.trend_strip.width if self.trend_strip else 0
+                layout = get_layout(self.display,len(sensors),clk.has_time,strip)
+                if not layout.fits:
+                    # too many sensors to show the time as well
+                    layout = get_layout(self.display,len(sensors),False,strip)
+                if not layout.fits:
+                    log.error(f"Only {len(layout.rows)} of {len(sensors)} sensors fit on the screen")
                     
-                # draw some lines
                 self.display.clear()
-                # Draw the lines after the fact
-                for row in range(1,len(self.display_coords)):
+                self.rows = {}
+                self.time_region.invalidate()
+                # Draw the lines between the rows
+                for x in layout.dividers:
                     # draw_line(x1, y1, x2, y2, color) in native coords
-                    self.display.draw_line(self.display_coords[row][0]-pad[0],
-                                           self.display_coords[row][1]-pad[1],
-                                           self.display_coords[row][0]-pad[0],
-                                           self.display_coords[row][3],
-                                           self.display.RED)
+                    self.display.draw_line(x,strip,x,self.display.MAX_Y,self.display.RED)
 
-            if clk.has_time:
+                if self.trend_strip:
+                    # graph each temperature beside its row
+                    self.trend_strip.set_series(
+                        [(x,h,self.display.GREEN) for x,h in layout.strip_series]
+                        )
+                    for x in layout.dividers:
+                        self.trend_strip.mark(x,self.display.RED)
+                    self.trend_strip.redraw()
+
+            if layout.time:
                 t = " "+clk.time_string()+" "
-                l = glyphs.string_width(t)
-                # Display the time (native coords)
-                self.draw_glyphs(glyphs,self.display_coords[0][0],self.display_coords[0][1]-pad[1]+int((self.display.MAX_Y-l)/2),t)
+                region = layout.time
+                self.time_region.draw(region.glyphs,region.x,region.place(region.glyphs.string_width(t)),t)
+            lap = self._lap("render_us",lap)
                 
-            #only interested in the last two elements for temperatures
-            display_rows = self.display_coords[-2:] 
-            
             row = 0
             changed_sensors = []
+            logged_sensors = [] # logged once the pass is timed
+            trend = []
             
+            # everything below uses the readings taken here
+            i2c_start = sensors.i2c_count
+            if not (sampler and sampler.reduce()):
+                sensors.read()
+            lap = self._lap("read_us",lap)
             for sensor in sensors:
-                if sensor.temp_changed() or force_refresh:
+                # None for the sensors past the last row that fits
+                layout_row = layout.rows[row] if row < len(layout.rows) else None
+                if not sensor.connected or sensor.reading is None:
+                    # show it is missing once, until it has a reading
+                    if sensor.name not in self.missing or force_refresh:
+                        self.missing.add(sensor.name)
+                        self.display_temp(sensor,layout_row,missing=True)
+                        self.display_detail(sensor,layout_row)
+                        lap = self._lap("render_us",lap)
+                    row +=1
+                    if self.trend_strip:
+                        trend.append(None)
+                    continue
+                self.missing.discard(sensor.name)
+                changed = sensor.temp_changed()
+                lap = self._lap("read_us",lap)
+                if changed or force_refresh:
                     try:
-                        changed_sensors.append(sensor)
                         utils.hinlow(sensor.name,sensor.adjusted_temperature)
-                        self.display_temp(sensor,display_rows[row],glyphs)
+                        changed_sensors.append(sensor)
+                        lap = self._lap("hinlow_us",lap)
+                        self.display_temp(sensor,layout_row)
                     except Exception as e:
                         log.exception(e,f"Sensor Error for {sensor.name}")
-                        self.display_temp(sensor,display_rows[row],glyphs)
+                        self.display_temp(sensor,layout_row)
+                    lap = self._lap("render_us",lap)
+                self.display_detail(sensor,layout_row)
+                lap = self._lap("render_us",lap)
                         
-                log.info(f'Reading- {sensor.name}: raw; {sensor.c_to_f(sensor.temperature)}, adjusted; {sensor.adjusted_temperature}')
+                logged_sensors.append(sensor)
                 row +=1
+                
+                if self.trend_strip:
+                    try:
+                        trend.append(sensor.smoothed_temperature)
+                    except Exception:
+                        trend.append(None)
+                lap = self._lap("read_us",lap)
+            
+            if self.trend_strip:
+                # one new column per pass
+                self.trend_strip.add(trend)
+                lap = self._lap("render_us",lap)
                        
             # Export changed readings
             for sensor in changed_sensors:
@@ -165,6 +268,22 @@ class Weather_Station:
                     utils.export_reading(sensor)
                 except Exception as e:
                     log.info(f'Sensor {sensor.name} export failed')
+            lap = self._lap("export_us",lap)
+            
+            self.stats["frame_us"] = time.ticks_diff(lap,frame_start)
+            self.stats["i2c"] = sensors.i2c_count - i2c_start
+            self.stats["exports"] = len(changed_sensors)
+            self.stats["sensors"] = sensors.health_stats()
+            display_stats = self.display.stats()
+            if display_stats:
+                self.stats["display"] = display_stats
+            for sensor in logged_sensors:
+                mes = f'Reading- {sensor.name}: raw; {sensor.c_to_f(sensor.temperature)}, adjusted; {sensor.adjusted_temperature}'
+                if self.log_stats and sensor is logged_sensors[-1]:
+                    # on the last reading line rather than a line (and
+                    # a log export) of their own
+                    mes += f' Frame: {self.stats} Glyph cache: {glyph_metrics.glyph_cache.stats()}'
+                log.info(mes)
                 
             if connection.is_connected() and clk.last_sync_seconds < (time.time() - (3600 * 1)):
                 # if it's been longer than 1 hour since last sync update the clock
@@ -178,20 +297,37 @@ class Weather_Station:
                     log.exception(e,f"Error during update attempt")
                 
             # Sync the display time to the top of the minute
-            # then sleep for 1 minute
-            time.sleep(60 - time.localtime()[5])
+            # then sleep (or sample) for 1 minute
+            if sampler:
+                sampler.run(60 - time.localtime()[5])
+            else:
+                time.sleep(60 - time.localtime()[5])
               
 
-    def display_temp(self,sensor,row,glyphs):
+    def _lap(self,phase,start):
+        """Add the time since start (ticks_us) to phase in self.stats
+        and return the time now"""
+        now = time.ticks_us()
+        self.stats[phase] += time.ticks_diff(now,start)
+        return now
+        
+    def display_temp(self,sensor,row,missing=False):
         # display the temperature
-        # row is now a tuple as (x,y)
+        # row is the layout.Sensor_Row to draw it in, or None if
+        # the sensor has no room on the screen
+        # missing is True if the sensor isn't answering
+        if row is None:
+            return
         
         raw_temp = ""
         calibration_factor = ""
         temp = "--"
         name = "Unknown"
 
-        if not isinstance(sensor,str):
+        if missing:
+            temp = "--?"
+            name = sensor.name
+        elif not isinstance(sensor,str):
             try:
                 temp = "{:.1f}".format(sensor.adjusted_temperature) #Truncate to 1 decimal place
                 name = sensor.name
@@ -199,41 +335,54 @@ class Weather_Station:
                 log.exception(e,f'Error adjusting temperature')
                 temp = "--?"
 
-        # clear the row
-        btn = Button(self.display.settings,
-             name = "label_btn",
-             x=row[1],
-             y=row[0],
-             h=row[2],
-             w=row[3],
-             offsets=None,
-             label = " ",
-             font = None,
-             font_color = self.display.WHITE,
-             background = self.display.BLACK,
-             landscape=True,
-             )
+        # only clear the row and draw the label when the row is new
+        # after that just the glyphs that change get redrawn
+        rec = self.rows.get(row)
+        if rec is None or rec["label"] != name:
+            btn = Button(self.display.settings,
+                 name = "label_btn",
+                 x=0,
+                 y=row.x,
+                 h=row.h,
+                 w=row.w,
+                 offsets=None,
+                 label = " ",
+                 font = None,
+                 font_color = self.display.WHITE,
+                 background = self.display.BLACK,
+                 landscape=True,
+                 )
 
-        btn.show()
+            btn.show()
 
-        # Label the value
-        self.display.draw_text(
-                      row[0],
-                      self.display.MAX_Y - 6,
-                      name,
-                      self.display.body_font,
-                      self.display.WHITE,
-                      background=0,
-                      landscape=True,
-                      spacing=1,
-                      )
+            # Label the value
+            self.display.draw_text(
+                          row.label[0],
+                          row.label[1],
+                          name,
+                          self.display.body_font,
+                          self.display.WHITE,
+                          background=0,
+                          landscape=True,
+                          spacing=1,
+                          )
+            
+            rec = {"label":name,"detail":"","temp_text":""}
+            for key in ("temp","low","high"):
+                rec[key] = Glyph_Region(self.display,self.display.BLACK)
+            self.rows[row] = rec
         
         # for testing
 #         temp = "199.0"
         
         
         # Finnally, display the temperture
-        self.draw_glyphs(glyphs,row[0],row[1],temp)
+        region = row.temp
+        if region.glyphs:
+            rec["temp"].draw(region.glyphs,region.x,region.place(region.glyphs.string_width(temp)),temp)
+        else:
+            # no room for the glyphs; right aligned in the body font
+            self.draw_temp_text(rec,region,temp)
         
         # high and low temps
         # show the low temp if present
@@ -244,32 +393,99 @@ class Weather_Station:
             # this can happen if temp is NaN
             temp = None
             
-        if temp is not None:
+        lo_hi = ""
+        if sensor.name in hiorlow:
+            lo_hi = "{}{}".format(hiorlow[sensor.name]['low'],hiorlow[sensor.name]['high'])
+        if temp is not None and row.low and row.low.glyphs.can_draw(lo_hi):
+            # (the high and low glyphs have no minus sign)
             if temp >= 100 or hiorlow[sensor.name]['high'] >= 100:
                 # use smaller type
-                glyphs = glyph_metrics.Metrics_27()
+                glyphs = row.wide_glyphs
             else:
-                glyphs = glyph_metrics.Metrics_37()
+                glyphs = row.low.glyphs
                 
-            old_path = glyphs.path
-            glyphs.path = old_path + 'blue/'
+            glyphs.set_color(self.low_color,'blue')
             text = str(hiorlow[sensor.name]['low'])
-            x = row[0]+30        
-            y = self.display.MAX_Y - 6 - glyphs.string_width(text)
-            self.draw_glyphs(glyphs,x,y,text)
-            glyphs.path = old_path + 'red/'
+            x = row.low.x
+            y = row.low.place(glyphs.string_width(text))
+            if rec["low"].value is not None and rec["low"].width != glyphs.string_width(text):
+                # the high temp moves with the width of the low one
+                # and they could overlap. Just start over.
+                rec["low"].clear()
+                rec["high"].clear()
+            rec["low"].draw(glyphs,x,y,text)
+            glyphs.set_color(self.high_color,'red')
             text = str(hiorlow[sensor.name]['high'])
             y = y - int(glyphs.WIDTH/2) - glyphs.string_width(text)
-            self.draw_glyphs(glyphs,x,y,text)
+            rec["high"].draw(glyphs,x,y,text)
+        else:
+            rec["low"].clear()
+            rec["high"].clear()
 
-        
-    def draw_glyphs(self,glyphs,x,y,value):
-        # send each digit to the display one at a time in reverse order
 
-        for i in range(len(value)-1,-1,-1):
-            glyph = glyphs.get(value[i])
-            self.display.draw_image(glyph['path'], x=x, y=y, w=glyph["h"], h=glyph["w"])
-            y += glyph["w"]
+    def draw_temp_text(self,rec,region,temp):
+        # draw temp in the body font at the right of region and blank
+        # the left of any longer old temp
+        if temp == rec["temp_text"]:
+            return
+        font = self.display.body_font
+        width = font.measure_text(temp,1)
+        y = region.place(width)
+        old_width = rec.get("temp_width",0)
+        if old_width > width:
+            self.display.fill_rectangle(region.x,y + width,font.height,old_width - width,0)
+        rec["temp_text"] = temp
+        rec["temp_width"] = width
+        self.display.draw_text(
+                      region.x,
+                      y + width,
+                      temp,
+                      font,
+                      self.display.WHITE,
+                      background=0,
+                      landscape=True,
+                      spacing=1,
+                      )
+
+    def display_detail(self,sensor,row):
+        # the pressure and tendency and the humidity on the line under
+        # the temperature, if they are wanted and there is room
+        if row is None or not (self.show_pressure or self.show_humidity) or not row.detail:
+            return
+        rec = self.rows.get(row)
+        if rec is None:
+            return
+
+        text = ""
+        if sensor.connected and sensor.reading is not None:
+            try:
+                if self.show_pressure:
+                    # inHg and kPa need 2 decimal places, hPa 1
+                    fmt = "{:.1f}{} " if sensor.press_units in ("hpa","mb") else "{:.2f}{} "
+                    text = fmt.format(sensor.adjusted_pressure,TENDENCY_MARKS.get(sensor.tendency,""))
+                humidity = sensor.humidity
+                if self.show_humidity and humidity is not None:
+                    text += "{:.0f}%".format(humidity)
+            except Exception as e:
+                log.exception(e,f'Error getting the pressure or humidity')
+                text = "--?"
+        text = text.strip()[:row.detail_chars]
+        if text == rec["detail"]:
+            return
+        
+        # spaces over any of the old text that is left
+        padded = text + " " * (len(rec["detail"]) - len(text))
+        rec["detail"] = text
+        self.display.draw_text(
+                      row.detail[0],
+                      row.detail[1],
+                      padded,
+                      self.display.body_font,
+                      self.display.WHITE,
+                      background=0,
+                      landscape=True,
+                      spacing=1,
+                      )
 
 
         
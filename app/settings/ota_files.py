@@ -8,10 +8,21 @@ def get_ota_file_list():
         'settings/credentials.conf',
         'settings/settings.py',
         'settings/tickle.txt',
+        'lib/display/display.py',
+        'lib/display/xglcd_font.py',
         'lib/display/glyph_metrics.py',
+        'lib/display/glyph_region.py',
+        'lib/display/layout.py',
+        'lib/display/trend_strip.py',
         'lib/ota_update/ota_update.py',
         'lib/ota_update/check_for_updates.py',
         'lib/bmx.py',
+        'lib/bmx280_bl.py',
+        'lib/bmx_registry.py',
+        'lib/calibration.py',
+        'lib/sampler.py',
+        'lib/history.py',
+        'lib/ili9341.py',
         'lib/ntp_clock.py',
         'lib/wifi_connect.py',
         'lib/os_path.py',
@@ -25,10 +25,14 @@ class Settings:
         self.UTC_offset = utc
                     
         self.sensor_json_file = '/instance/sensors.json'
+        # (bus_id, scl, sda) of the sensor sockets for sensors the host
+        # doesn't give the pins for. bus_id None is a SoftI2C bus
+        self.default_sensor_buses = ((1,19,18),(None,1,0))
         self.calibration_json_file = '/instance/calibration_data.json'
 
         # display spi setup
-        self.spi = SPI(0,
+        self.display_spi_id = 0
+        self.spi = SPI(self.display_spi_id,
             sck=Pin(2),
             miso=Pin(4),
             mosi=Pin(3),
@@ -37,6 +41,61 @@ class Settings:
         self.display_cs = 5
         self.display_rst = 7
         
+        # bytes of RAM to use for caching glyph images. Glyphs bigger than
+        # an eighth of this are drawn straight from flash
+        self.glyph_cache_bytes = 32 * 1024
+        # bytes of RAM to use for rendered font letters
+        self.font_cache_bytes = 8 * 1024
+        # pixels at the right of the screen used to graph recent
+        # temperatures, one column per reading. 0 for no graph
+        self.trend_strip_width = 0
+        # add the frame stats (time spent on each part of the display
+        # loop, sensor health and glyph cache use) to the last reading
+        # logged each pass
+        self.log_frame_stats = True
+        # count the bytes and time spent sending to the display and
+        # add them to the frame stats in the log
+        self.display_stats = False
+        # "forced" has the sensors take a measurement each time they are
+        # read. "normal" has them measure by themselves every
+        # bmx_standby_ms and reading just fetches the latest result
+        self.bmx_mode = "forced"
+        self.bmx_standby_ms = 1000
+        # IIR filter coefficient to smooth the readings; 0 (off), 2, 4, 8 or 16
+        self.bmx_iir = 0
+        # directory to keep a copy of each sensor's calibration in so a
+        # restart doesn't have to read it all again. None to always read it
+        self.bmx_cal_dir = '/instance'
+        # how the calibration data is applied: "linear" for straight
+        # lines between the points, "fit" for the best straight line
+        # through all of them
+        self.temp_calibration_mode = "linear"
+        # read the sensors this often (ms) between display updates and
+        # show the average. 0 for one reading per update
+        self.sample_interval_ms = 1000
+        # samples kept per sensor (at least a minute's worth)
+        self.sample_buffer_size = 60
+        # Only redraw and export a temperature when it moves at least
+        # temp_deadband degrees. Each reading is smoothed first; the weight
+        # of a new reading is temp_filter_alpha (1 for no smoothing).
+        self.temp_deadband = 0.2
+        self.temp_filter_alpha = 0.5
+        # export a temperature at least this often (seconds) even if it
+        # hasn't changed. 0 for never
+        self.temp_max_silent_s = 900
+        # units pressures are shown and exported in: "inhg", "hpa", "mb"
+        # or "kpa"
+        self.pressure_units = "inhg"
+        # keep a reading every history_period_s seconds for the last
+        # history_window_s. The pressure tendency is the change over
+        # the window
+        self.history_period_s = 600
+        self.history_window_s = 3 * 3600
+        # show the pressure and tendency and/or the humidity under each
+        # sensor's high and low temps when there is room
+        self.show_pressure = False
+        self.show_humidity = False
+        
        
     @property
     def bmx_list(self):
@@ -72,29 +131,50 @@ class Settings:
             sensors = []
                     
         bmx_list = []
+        calibration_data = None
         for x, sensor in enumerate(sensors):
             d = {}
             
-            if x > 1:
-                # we can only handle 2 sensors at most
-                break
-            
             # I2C Setup
-            if x == 0:
-                d['bus_id']=1
-                d['scl_pin']=19
-                d['sda_pin']=18
-            else:
-                d['bus_id']=0
-                d['scl_pin']=1
-                d['sda_pin']=0
+            # The host may give the bus ("soft" or a hardware bus number),
+            # pins and address of each sensor. If not, the first two use
+            # the board's two sensor sockets and any more share them at
+            # the second address. A bus without pins uses the pins of the
+            # socket on that bus.
+            bus_id, scl_pin, sda_pin = self.default_sensor_buses[x % 2]
+            if 'bus' in sensor:
+                bus_id = sensor['bus']
+                if bus_id == 'soft':
+                    bus_id = None
+                elif bus_id is not None:
+                    bus_id = int(bus_id)
+                scl_pin = sda_pin = None
+                for socket in self.default_sensor_buses:
+                    if socket[0] == bus_id:
+                        scl_pin, sda_pin = socket[1:]
+                        break
+            d['bus_id'] = bus_id
+            scl_pin = sensor.get('scl',scl_pin)
+            sda_pin = sensor.get('sda',sda_pin)
+            if scl_pin is None or sda_pin is None:
+                log.error(f'No scl and sda pins for sensor {sensor.get("name")} on bus {bus_id}')
+                continue
+            d['scl_pin'] = int(scl_pin)
+            d['sda_pin'] = int(sda_pin)
+            address = sensor.get('address',0x76 if x < 2 else 0x77)
+            if isinstance(address,str):
+                address = int(address,0) # "0x77" or "119"
+            d['address'] = address
                     
             d['name'] = sensor['name']
             d['sensor_id'] = int(sensor['id'])
             d['scale'] = sensor['scale']
             
             try:
-                d['cal_data'] = self.calibration_data[str(d['sensor_id'])]
+                if calibration_data is None:
+                    # one request for all the sensors
+                    calibration_data = self.calibration_data
+                d['cal_data'] = calibration_data[str(d['sensor_id'])]
             except Exception as e:
                 d['cal_data'] = []
                 log.exception(e,f'Calibration failed with sensor id {d["sensor_id"]}')                   
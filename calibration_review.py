@@ -1,3 +1,21 @@
+"""
+Review temperature calibration points.
+
+    python calibration_review.py [calibration_data.json]
+
+For each sensor print the points with their observed / raw factor, then
+for each calibration mode the corrected value and residual at each point
+and the corrected curve across the range. Without a file the points
+below are used.
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app', 'lib'))
+from calibration import Calibration, LINEAR, FIT  # noqa: E402
+
 l = {
     'Indoor': [
         (68.2, 65.0),
@@ -18,6 +36,10 @@ l = {
         ],
     }
 
+if len(sys.argv) > 1:
+    with open(sys.argv[1]) as f:
+        l = json.load(f)
+
 head = "raw\t|\tactual\t|\tfactor"
 for key,value in l.items():
     print(key)
@@ -27,4 +49,15 @@ for key,value in l.items():
         cal = int((v[1]/v[0])*100)/100
         cal = str(cal)[0:4]
         print(v[0],"\t|\t",v[1],"\t|\t",cal)
+
+    for mode in (LINEAR, FIT):
+        calibration = Calibration(value, mode)
+        print()
+        print(f"{mode}: raw\t|\tactual\t|\tcorrected\t|\tresidual")
+        for raw, obs, fitted, error in calibration.residuals():
+            print(f"{raw}\t|\t{obs}\t|\t{fitted}\t\t|\t{error:+.2f}")
+        lo = int(min(v[0] for v in value)) - 5
+        hi = int(max(v[0] for v in value)) + 5
+        print(f"{mode} curve: " + ", ".join(f"{raw:g}>{out:g}" for raw, out in calibration.curve(lo, hi, 5)))
+    print()
         
\ No newline at end of file
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Utility to compile an X-GLCD 'C' font file to binary.
+
+    ./font2bin.py Unispace12x24.c 12 24 [start letter] [letter count]
+
+The binary file is saved next to the source with a .xgf extension.
+XglcdFont will load it in one read instead of parsing the .c file.
+"""
+
+from struct import pack
+from os import path
+import sys
+
+FONT_MAGIC = b'XGF1'
+
+
+def error(msg):
+    """Display error and exit."""
+    print (msg)
+    sys.exit(-1)
+
+
+def read_xglcd_font(in_path, bytes_per_letter):
+    """Return the letter data from a X-GLCD 'C' font file.
+
+    Parsed the same way as XglcdFont.__load_xglcd_font.
+    """
+    letters = bytearray()
+    with open(in_path, 'r') as f:
+        for line in f:
+            # Skip lines that do not start with hex values
+            line = line.strip()
+            if len(line) == 0 or line[0:2] != '0x':
+                continue
+            # Remove comments
+            comment = line.find('//')
+            if comment != -1:
+                line = line[0:comment].strip()
+            # Remove trailing commas
+            if line.endswith(','):
+                line = line[0:len(line) - 1]
+            data = bytearray(int(b, 16) for b in line.split(','))
+            if len(data) != bytes_per_letter:
+                error('Expected {} bytes per letter, got {}: {}'.format(
+                    bytes_per_letter, len(data), line))
+            letters += data
+    return letters
+
+
+def write_font(out_path, letters, width, height, start_letter, letter_count,
+               bytes_per_letter):
+    """Save the font.
+
+    Layout (little endian):
+        header: magic (4s), width (B), height (B), start letter (B),
+            letter count (B), bytes per letter (H)
+        data: bytes_per_letter * letter_count bytes of letter data
+    """
+    with open(out_path, 'wb') as f:
+        f.write(pack('<4sBBBBH', FONT_MAGIC, width, height, start_letter,
+                     letter_count, bytes_per_letter))
+        f.write(letters)
+
+
+if __name__ == '__main__':
+    args = sys.argv
+    if len(args) not in (4, 5, 6):
+        error('Please specify font file, width and height: '
+              './font2bin.py Unispace12x24.c 12 24')
+    in_path = args[1]
+    if not path.exists(in_path):
+        error('File Not Found: ' + in_path)
+    width = int(args[2])
+    height = int(args[3])
+    start_letter = int(args[4]) if len(args) > 4 else 32
+    letter_count = int(args[5]) if len(args) > 5 else 96
+
+    # Same as XglcdFont.bytes_per_letter
+    bytes_per_letter = ((height - 1) // 8 + 1) * width + 1
+    letters = read_xglcd_font(in_path, bytes_per_letter)
+    if len(letters) != bytes_per_letter * letter_count:
+        error('Expected {} letters, found {}'.format(
+            letter_count, len(letters) // bytes_per_letter))
+
+    out_path = path.splitext(in_path)[0] + '.xgf'
+    write_font(out_path, letters, width, height, start_letter, letter_count,
+               bytes_per_letter)
+    print('Saved: ' + out_path)
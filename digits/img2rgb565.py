@@ -1,11 +1,45 @@
 # -*- coding: utf-8 -*-
-"""Utility to convert images to raw RGB565 format."""
+"""Utility to convert images to raw RGB565 format.
 
-from PIL import Image
+Also packs a whole glyph set into a single atlas file for the
+weather station display:
+
+    ./img2rgb565.py --atlas <glyph dir> <glyph height> [out dir]
+
+The glyph dir must hold the digit_*.png or digit_*.raw files for one
+size/colour set. The atlas is saved as glyphs.atlas in out dir, or the
+glyph dir if out dir is not given.
+The glyphs are stored run length encoded against a palette of the colours
+used in the set unless it has more than 256 colours.
+
+A single colour set can instead be saved as a mask atlas that the display
+can draw in any colour:
+
+    ./img2rgb565.py --mask <glyph dir> <glyph height> <out dir> [levels]
+
+Each pixel is stored as one of levels (default 16) steps between the
+background and the set's main colour. The atlas is saved as glyphs.atlas
+in out dir, normally the parent of the colour directories.
+"""
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None # only needed to convert png files
 from struct import pack
-from os import path
+from os import path, listdir
 import sys
 
+ATLAS_NAME = 'glyphs.atlas'
+ATLAS_MAGIC = b'GLYA'
+ATLAS_VERSION = 1 # plain RGB565
+ATLAS_RLE_VERSION = 2 # palette indexed and run length encoded
+ATLAS_MASK_VERSION = 3 # intensity levels, run length encoded
+MAX_RUN = 256
+
+# digit_<name> files that are not named for their character
+GLYPH_NAMES = {'dot': '.', 'dash': '-', 'colon': ':', 'space': ' ', 'huh': '?'}
+
 
 def error(msg):
     """Display error and exit."""
@@ -15,15 +49,238 @@ def error(msg):
 
 def write_bin(f, pixel_list):
     """Save image in RGB565 format."""
+    f.write(rgb565_bytes(pixel_list))
+
+
+def rgb565_bytes(pixel_list):
+    """Return image pixels as RGB565 bytes."""
+    out = bytearray()
     for pix in pixel_list:
         r = (pix[0] >> 3) & 0x1F
         g = (pix[1] >> 2) & 0x3F
         b = (pix[2] >> 3) & 0x1F
-        f.write(pack('>H', (r << 11) + (g << 5) + b))
+        out += pack('>H', (r << 11) + (g << 5) + b)
+    return bytes(out)
+
+
+def read_glyphs(glyph_dir):
+    """Return a dict of char: RGB565 bytes for the glyph files in glyph_dir.
+
+    Raw files are used as is. Png files are converted and take the
+    place of a raw file with the same name.
+    """
+    glyphs = {}
+    for filename in sorted(listdir(glyph_dir)):
+        name, ext = path.splitext(filename)
+        if not name.startswith('digit_') or ext not in ('.raw', '.png'):
+            continue
+        name = name[len('digit_'):]
+        char = GLYPH_NAMES.get(name, name)
+        if len(char) != 1:
+            print('Skipping: ' + filename)
+            continue
+        if ext == '.png':
+            if Image is None:
+                error('PIL is required to convert ' + filename)
+            img = Image.open(path.join(glyph_dir, filename)).convert('RGB')
+            glyphs[char] = rgb565_bytes(img.getdata())
+        elif char not in glyphs:
+            with open(path.join(glyph_dir, filename), 'rb') as f:
+                glyphs[char] = f.read()
+    return glyphs
+
+
+def make_palette(glyphs):
+    """Return a list of the 2 byte RGB565 colours used in glyphs,
+    most used first"""
+    counts = {}
+    for data in glyphs.values():
+        for i in range(0, len(data), 2):
+            color = data[i:i + 2]
+            counts[color] = counts.get(color, 0) + 1
+    return sorted(counts, key=lambda c: -counts[c])
+
+
+def rle_encode(data, palette):
+    """Return RGB565 data as pairs of run length - 1 and palette index"""
+    index = {color: i for i, color in enumerate(palette)}
+    return rle_runs(index[data[i:i + 2]] for i in range(0, len(data), 2))
+
+
+def rle_runs(values):
+    """Return a sequence of byte values as pairs of run length - 1 and value"""
+    out = bytearray()
+    run = 0
+    last = None
+    for color in values:
+        if color == last and run < MAX_RUN:
+            run += 1
+            continue
+        if run:
+            out += bytes((run - 1, last))
+        last = color
+        run = 1
+    if run:
+        out += bytes((run - 1, last))
+    return bytes(out)
+
+
+def write_atlas(out_path, glyphs, height, encode=True):
+    """Save a packed glyph atlas.
+
+    Layout (little endian):
+        header: magic (4s), version (B), glyph count (B), height (H)
+        table: one entry per glyph of char (B), width (H), height (H),
+            data offset from start of file (I)
+        data: the RGB565 pixels for each glyph, in table order
+
+    If encode is True and the set uses 256 colours or less, version 2 is
+    written instead:
+        header: as above
+        palette: colour count (H) then each colour as big endian RGB565
+        table: as above with the data size (I) added to each entry
+        data: pairs of bytes for each glyph, run length - 1 and
+            palette index, in table order
+
+    Returns the version written.
+    """
+    palette = make_palette(glyphs) if encode else None
+    if palette is not None and len(palette) > 256:
+        print('{} colours, too many for a palette. '
+              'Saving RGB565.'.format(len(palette)))
+        palette = None
+    if palette is not None:
+        return write_rle_atlas(out_path, glyphs, height, palette)
+
+    chars = sorted(glyphs)
+    offset = 8 + 9 * len(chars)
+    table = bytearray()
+    for char in chars:
+        size = len(glyphs[char])
+        if size % (height * 2):
+            error('Glyph {!r} is not {} pixels high'.format(char, height))
+        table += pack('<BHHI', ord(char), size // (height * 2), height,
+                      offset)
+        offset += size
+    with open(out_path, 'wb') as f:
+        f.write(pack('<4sBBH', ATLAS_MAGIC, ATLAS_VERSION, len(chars),
+                     height))
+        f.write(table)
+        for char in chars:
+            f.write(glyphs[char])
+    return ATLAS_VERSION
+
+
+def write_rle_atlas(out_path, glyphs, height, palette):
+    """Save a version 2 (run length encoded) atlas. See write_atlas"""
+    encoded = {c: rle_encode(data, palette) for c, data in glyphs.items()}
+    write_encoded_atlas(out_path, ATLAS_RLE_VERSION, glyphs, encoded,
+                        height, len(palette), b''.join(palette))
+    return ATLAS_RLE_VERSION
+
+
+def write_mask_atlas(out_path, glyphs, height, levels=16):
+    """Save a version 3 (mask) atlas.
+
+    Same as version 2 except the colour count is the number of levels and
+    the palette is just the main colour of the set, used when no other is
+    asked for. The display makes a palette of levels steps from the
+    background to whatever colour it draws the glyphs in.
+    """
+    if not 2 <= levels <= 256:
+        error('levels must be from 2 to 256')
+    color = main_color(glyphs)
+    encoded = {c: rle_runs(mask_levels(data, color, levels))
+               for c, data in glyphs.items()}
+    write_encoded_atlas(out_path, ATLAS_MASK_VERSION, glyphs, encoded,
+                        height, levels, pack('>H', color))
+    return ATLAS_MASK_VERSION
+
+
+def write_encoded_atlas(out_path, version, glyphs, encoded, height,
+                        color_count, palette):
+    """Write the header, palette, table and encoded glyph data"""
+    chars = sorted(glyphs)
+    offset = 8 + 2 + len(palette) + 13 * len(chars)
+    table = bytearray()
+    for char in chars:
+        size = len(glyphs[char])
+        if size % (height * 2):
+            error('Glyph {!r} is not {} pixels high'.format(char, height))
+        table += pack('<BHHII', ord(char), size // (height * 2), height,
+                      offset, len(encoded[char]))
+        offset += len(encoded[char])
+    with open(out_path, 'wb') as f:
+        f.write(pack('<4sBBH', ATLAS_MAGIC, version, len(chars), height))
+        f.write(pack('<H', color_count))
+        f.write(palette)
+        f.write(table)
+        for char in chars:
+            f.write(encoded[char])
+
+
+def to_rgb(value):
+    """Return RGB565 value as r, g, b from 0 to 1"""
+    return (((value >> 11) & 0x1F) / 31, ((value >> 5) & 0x3F) / 63,
+            (value & 0x1F) / 31)
+
+
+def main_color(glyphs):
+    """The most used colour in glyphs other than black"""
+    palette = [c for c in make_palette(glyphs) if c != b'\x00\x00']
+    if not palette:
+        error('The glyphs have no colour')
+    return (palette[0][0] << 8) | palette[0][1]
+
+
+def mask_levels(data, color, levels):
+    """Return the level from 0 (black) to levels - 1 (color) of each pixel
+    in RGB565 data"""
+    fg = to_rgb(color)
+    fg_sq = sum(c * c for c in fg)
+    for i in range(0, len(data), 2):
+        pixel = to_rgb((data[i] << 8) | data[i + 1])
+        # how far the pixel is along the line from black to color
+        amount = sum(p * c for p, c in zip(pixel, fg)) / fg_sq
+        yield int(round(min(max(amount, 0), 1) * (levels - 1)))
 
 
 if __name__ == '__main__':
     args = sys.argv
+    if len(args) > 1 and args[1] == '--atlas':
+        if len(args) not in (4, 5):
+            error('Please specify glyph dir and height: '
+                  './img2rgb565.py --atlas images/78 78 [out dir]')
+        glyph_dir = args[2]
+        if not path.isdir(glyph_dir):
+            error('Directory Not Found: ' + glyph_dir)
+        glyphs = read_glyphs(glyph_dir)
+        if not glyphs:
+            error('No glyph files in: ' + glyph_dir)
+        out_path = path.join(args[4] if len(args) == 5 else glyph_dir,
+                             ATLAS_NAME)
+        version = write_atlas(out_path, glyphs, int(args[3]))
+        print('Saved: {} ({} glyphs, version {})'.format(
+            out_path, len(glyphs), version))
+        sys.exit(0)
+
+    if len(args) > 1 and args[1] == '--mask':
+        if len(args) not in (5, 6):
+            error('Please specify glyph dir, height and output dir: '
+                  './img2rgb565.py --mask images/37/red 37 images/37')
+        glyph_dir = args[2]
+        if not path.isdir(glyph_dir):
+            error('Directory Not Found: ' + glyph_dir)
+        glyphs = read_glyphs(glyph_dir)
+        if not glyphs:
+            error('No glyph files in: ' + glyph_dir)
+        out_path = path.join(args[4], ATLAS_NAME)
+        levels = int(args[5]) if len(args) == 6 else 16
+        write_mask_atlas(out_path, glyphs, int(args[3]), levels)
+        print('Saved: {} ({} glyphs, {} levels)'.format(
+            out_path, len(glyphs), levels))
+        sys.exit(0)
+
     if len(args) != 2:
         error('Please specify input file: ./img2rgb565.py test.png')
     in_path = args[1]
@@ -0,0 +1,107 @@
+"""
+Run the weather station code on a desktop python (CPython).
+
+install() puts stand ins for the MicroPython only modules (machine,
+micropython, utime, ustruct...) in sys.modules, adds the app directories
+to sys.path and attaches a simulated ILI9341 panel to the SPI bus. After
+that the app modules can be imported as they are on the device:
+
+    import sim
+    panel = sim.install()
+    from weather_station.weather_station import Weather_Station
+
+Absolute paths (like /lib/display/images/78/) are looked up relative to
+the app directory, which plays the part of the device flash.
+"""
+
+import builtins
+import os
+import sys
+import time
+import traceback
+import types
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+
+_installed = None
+
+
+def install(app_dir=APP_DIR, dc=6, cs=5):
+    """Set up the MicroPython stand ins and return the simulated Panel.
+
+    dc and cs are the pin numbers the display is wired to (see
+    settings.Settings). Calling install() again returns the same panel.
+    """
+    global _installed
+    if _installed:
+        return _installed
+
+    builtins.const = lambda x: x
+    _patch_time()
+    sys.print_exception = lambda e, f=sys.stderr: traceback.print_exception(e, file=f)
+    # wifi_connect checks this to decide if there is a radio
+    sys.implementation._machine = 'Host simulator'
+
+    from sim import machine, micropython
+    sys.modules['machine'] = machine
+    sys.modules['micropython'] = micropython
+    for name, real in (('ustruct', 'struct'), ('ujson', 'json'),
+                       ('ucollections', 'collections'), ('uhashlib', 'hashlib'),
+                       ('utime', 'time'),):
+        sys.modules[name] = __import__(real)
+
+    for path in (os.path.join(app_dir, 'lib'), app_dir):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    _open_from_flash(app_dir)
+    _load_app_package('logging', os.path.join(app_dir, 'lib', 'logging'))
+    if not os.path.exists(os.path.join(app_dir, 'instance', 'instance.py')):
+        # use the example device settings
+        _load_app_package('instance', os.path.join(app_dir, 'instance_example'))
+
+    from logging import logging as log
+    log.basicConfig(level=log.WARNING, filename=None)
+
+    from sim.panel import Panel
+    _installed = Panel(dc=dc, cs=cs)
+    machine.SPI.device = _installed
+    return _installed
+
+
+def _patch_time():
+    """Add the MicroPython extras to the time module"""
+    start = time.perf_counter()
+    time.ticks_ms = lambda: int((time.perf_counter() - start) * 1000)
+    time.ticks_us = lambda: int((time.perf_counter() - start) * 1000000)
+    time.ticks_diff = lambda a, b: a - b
+    time.ticks_add = lambda a, b: a + b
+    time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+    time.sleep_us = lambda us: time.sleep(us / 1000000)
+    mktime = time.mktime
+    # MicroPython takes an 8 item tuple
+    time.mktime = lambda t: int(mktime(tuple(t[:8]) + (-1,) * (9 - len(t[:8]))))
+
+
+def _open_from_flash(app_dir):
+    """Map absolute device paths on to app_dir"""
+    real_open = builtins.open
+
+    def flash_open(file, *args, **kwargs):
+        if isinstance(file, str) and file.startswith('/') and not file.startswith(app_dir):
+            mapped = os.path.join(app_dir, file[1:])
+            if os.path.exists(mapped) or os.path.isdir(os.path.dirname(mapped)):
+                file = mapped
+        return real_open(file, *args, **kwargs)
+
+    builtins.open = flash_open
+
+
+def _load_app_package(name, path):
+    """Make the app directory at path importable as package name.
+
+    Needed where the name is also in the python standard library
+    (logging) or has no __init__.py.
+    """
+    package = types.ModuleType(name)
+    package.__path__ = [path]
+    sys.modules[name] = package
@@ -0,0 +1,221 @@
+"""
+Measure the weather station drawing code on the simulated display.
+
+    python -m sim.bench [--png DIR] [--golden DIR] [--update-golden]
+    python -m sim.bench --sensor
+
+Each case is timed and the SPI traffic it causes is counted. With --png
+a screenshot of each case is saved. With --golden the screen after each
+case is compared to DIR/<case>.png (use --update-golden to write them).
+
+--sensor times the temperature maths for one reading and one sampler
+pass on a simulated sensor and measures the heap they use. CPython boxes every int over 256
+so the heap figure is higher than on the device (see bmx.heap_per_pass);
+it is for spotting new lists, strings or floats.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import sim
+
+panel = sim.install()
+
+from display.display import Button  # noqa: E402
+from display import glyph_metrics  # noqa: E402
+from display.layout import get_layout  # noqa: E402
+from display.trend_strip import Trend_Strip  # noqa: E402
+from weather_station import utils  # noqa: E402
+from weather_station.weather_station import Weather_Station  # noqa: E402
+
+
+class Fake_Sensor:
+    """Just enough of a BMX for display_temp"""
+
+    def __init__(self, name, temp):
+        self.name = name
+        self.adjusted_temperature = temp
+
+
+def get_cases(station):
+    """Return a list of (name, function) to measure, run in order"""
+    display = station.display
+    rows = get_layout(display, 2).rows
+    indoor = Fake_Sensor('Innerside', 71.5)
+    outdoor = Fake_Sensor('Outdoorsy', 58.3)
+
+    def reading(sensor, temp):
+        sensor.adjusted_temperature = temp
+        utils.hinlow(sensor.name, temp)
+
+    def clear():
+        display.clear()
+
+    def centered_text():
+        display.centered_text('Waiting for connection', y=50, width=display.MAX_Y)
+
+    def button_show():
+        Button(display.settings, name='bench', x=6, y=100, w=display.MAX_Y - 12, h=40,
+               label='Button', font_color=display.WHITE,
+               background=display.BLUE).show()
+
+    def display_temp_first():
+        display.clear()
+        station.rows = {}
+        reading(indoor, 71.5)
+        reading(outdoor, 58.3)
+        station.display_temp(indoor, rows[0])
+        station.display_temp(outdoor, rows[1])
+
+    def display_temp_same():
+        station.display_temp(indoor, rows[0])
+        station.display_temp(outdoor, rows[1])
+
+    def display_temp_last_digit():
+        reading(indoor, 71.6)
+        station.display_temp(indoor, rows[0])
+
+    def display_temp_shorter():
+        reading(outdoor, 9.8)
+        station.display_temp(outdoor, rows[1])
+
+    def trend_strip_redraw():
+        strip = Trend_Strip(display, 48, display.BLACK)
+        strip.set_series([(row.x + 2, row.h - 4, display.GREEN) for row in rows])
+        for i in range(40):
+            strip.add((70 + i % 7 * .3, 58 - i * .1))
+        station.trend_strip = strip
+        strip.redraw()
+
+    def trend_strip_add():
+        station.trend_strip.add((71.2, 53.9))
+
+    return [('clear', clear),
+            ('centered_text', centered_text),
+            ('button_show', button_show),
+            ('display_temp_first', display_temp_first),
+            ('display_temp_same', display_temp_same),
+            ('display_temp_last_digit', display_temp_last_digit),
+            ('display_temp_shorter', display_temp_shorter),
+            # leaves the display scrolled so keep these last
+            ('trend_strip_redraw', trend_strip_redraw),
+            ('trend_strip_add', trend_strip_add),
+            ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--png', help='save a screenshot of each case here')
+    parser.add_argument('--golden', help='compare each case with the png files here')
+    parser.add_argument('--update-golden', action='store_true',
+                        help='write the --golden files instead of comparing')
+    parser.add_argument('--sensor', action='store_true',
+                        help='measure the temperature maths instead of the display')
+    args = parser.parse_args(argv)
+
+    if args.sensor:
+        run_sensor()
+        return 0
+
+    for path in (args.png, args.golden):
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    # hinlow.txt and friends are written to the working directory
+    work_dir = tempfile.mkdtemp(prefix='weather_station_')
+    save_dir = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        station = Weather_Station()
+        failed = run(station, args)
+    finally:
+        os.chdir(save_dir)
+    return 1 if failed else 0
+
+
+def run(station, args):
+    failed = []
+    print('{:<26}{:>9}{:>9}{:>8}{:>8}{:>9}'.format(
+        'case', 'ms', 'bytes', 'writes', 'trans', 'windows'))
+    for name, case in get_cases(station):
+        panel.reset_stats()
+        start = time.perf_counter()
+        case()
+        elapsed = (time.perf_counter() - start) * 1000
+        stats = panel.stats()
+        print('{:<26}{:>9.2f}{:>9}{:>8}{:>8}{:>9}'.format(
+            name, elapsed, stats['bytes'], stats['writes'],
+            stats['transactions'], stats['windows']))
+
+        png = None
+        if args.png or args.golden:
+            png = panel.png()
+        if args.png:
+            with open(os.path.join(args.png, name + '.png'), 'wb') as f:
+                f.write(png)
+        if args.golden:
+            golden = os.path.join(args.golden, name + '.png')
+            if args.update_golden:
+                with open(golden, 'wb') as f:
+                    f.write(png)
+            elif not os.path.exists(golden):
+                failed.append(name)
+                print('  no golden image: ' + golden)
+            else:
+                with open(golden, 'rb') as f:
+                    if f.read() != png:
+                        failed.append(name)
+                        print('  differs from golden image: ' + golden)
+
+    print('glyph cache: {}'.format(glyph_metrics.glyph_cache.stats()))
+    return failed
+
+
+def measure(func, passes):
+    """Return (us per call, tracemalloc peak bytes of one call)"""
+    start = time.perf_counter()
+    for _ in range(passes):
+        func()
+    elapsed = (time.perf_counter() - start) * 1000000 / passes
+
+    tracemalloc.start()
+    func()
+    base = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    func()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def run_sensor(passes=10000):
+    from sim import bmx280
+    from bmx import BMX, temperature_pass
+    from bmx_registry import Sensor_Registry
+    from sampler import Sampler
+
+    bmx280.attach(1, temperature=21.5)
+    sensor = BMX(bus_id=1, scl_pin=19, sda_pin=18, temp_scale='f',
+                 temp_calibration_list=[[60.1, 58], [64, 62], [75.8, 73.4], [77.9, 75]])
+    sensor.read()
+    sensors = Sensor_Registry()
+    sensors.add(sensor)
+    sampler = Sampler(sensors, 1000, 60)
+
+    print('{:<26}{:>9}{:>12}'.format('case', 'us', 'heap peak'))
+    for name, func, count in (
+            ('temperature_pass', lambda: temperature_pass(sensor), passes),
+            # includes the simulated conversion time
+            ('sampler_sample', sampler.sample, 100),
+            ):
+        elapsed, peak = measure(func, count)
+        print('{:<26}{:>9.2f}{:>12}'.format(name, elapsed, peak))
+    print('adjusted: {} F'.format(sensor.adjusted_temperature))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+A simulated BMP280/BME280 on the I2C bus.
+
+The device keeps a register map with the datasheet's example calibration
+and turns the temperature, pressure (and humidity) it is set to in to raw
+readings with the compensation formulas run backwards. Forced and normal
+mode conversions take the time the datasheet gives for the oversampling
+written to ctrl_meas, and the STATUS measuring bit is set meanwhile.
+
+    from sim import bmx280
+    sensor = bmx280.attach(bus=1, temperature=21.5)
+
+Hardware buses are keyed by their id; a SoftI2C bus by ('soft', scl pin id).
+"""
+
+import struct
+import time
+
+from sim.machine import I2C
+
+CALIB_T = (27504, 26435, -1000)
+CALIB_P = (36477, -10685, 3024, 2855, 140, -7, 15500, -14600, 6000)
+CALIB_H = (75, 370, 0, 313, 50, 30)  # H1..H6
+
+CTRL_HUM = 0xF2
+STATUS = 0xF3
+CTRL_MEAS = 0xF4
+CONFIG = 0xF5
+DATA = 0xF7
+RESET = 0xE0
+
+OS_COUNT = (0, 1, 2, 4, 8, 16, 16, 16)
+STANDBY_MS = (0.5, 62.5, 125, 250, 500, 1000, 10, 20)
+
+
+class BMX280:
+    """A simulated sensor.
+
+    Params:
+        chip_id: 0x58 for a BMP280, 0x60 for a BME280
+        temperature: deg C
+        pressure: Pa
+        humidity: %RH (BME280 only)
+
+    Properties:
+        reads, writes: counts of readfrom_mem and writeto_mem calls
+        conversions: count of measurements made
+    """
+
+    def __init__(self, chip_id=0x58, temperature=20.0, pressure=101325.0,
+                 humidity=50.0):
+        self.chip_id = chip_id
+        self.temperature = temperature
+        self.pressure = pressure
+        self.humidity = humidity
+        self.regs = bytearray(256)
+        self.regs[0xD0] = chip_id
+        struct.pack_into('<Hhh', self.regs, 0x88, *CALIB_T)
+        struct.pack_into('<Hhhhhhhhh', self.regs, 0x8E, *CALIB_P)
+        if chip_id != 0x58:
+            h1, h2, h3, h4, h5, h6 = CALIB_H
+            self.regs[0xA1] = h1
+            struct.pack_into('<hB', self.regs, 0xE1, h2, h3)
+            self.regs[0xE4] = (h4 >> 4) & 0xFF
+            self.regs[0xE5] = (h4 & 0x0F) | ((h5 & 0x0F) << 4)
+            self.regs[0xE6] = (h5 >> 4) & 0xFF
+            struct.pack_into('<b', self.regs, 0xE7, h6)
+        self._busy_until = 0
+        self._next_sample = None
+        self.reads = 0
+        self.writes = 0
+        self.conversions = 0
+
+    @property
+    def transactions(self):
+        return self.reads + self.writes
+
+    def reset_stats(self):
+        self.reads = self.writes = self.conversions = 0
+
+    # bus side
+    def readfrom_mem(self, memaddr, nbytes):
+        self.reads += 1
+        self._update()
+        if memaddr == STATUS:
+            self.regs[STATUS] = 0x08 if self._measuring() else 0
+        return bytes(self.regs[memaddr:memaddr + nbytes])
+
+    def writeto_mem(self, memaddr, data):
+        self.writes += 1
+        self._update()
+        for i, value in enumerate(data):
+            reg = memaddr + i
+            if reg == RESET:
+                if value == 0xB6:
+                    self.regs[CTRL_HUM:CONFIG + 1] = bytes(4)
+                    self._next_sample = None
+                continue
+            self.regs[reg] = value
+            if reg == CTRL_MEAS:
+                mode = value & 0x03
+                if mode in (1, 2):
+                    self._start_conversion()
+                elif mode == 3:
+                    self._next_sample = time.ticks_ms()
+                else:
+                    self._next_sample = None
+
+    # device side
+    def _now(self):
+        return time.ticks_ms()
+
+    def _measuring(self):
+        return self._now() < self._busy_until
+
+    def conversion_ms(self):
+        ctrl = self.regs[CTRL_MEAS]
+        t_os = OS_COUNT[ctrl >> 5]
+        p_os = OS_COUNT[(ctrl >> 2) & 0x07]
+        h_os = OS_COUNT[self.regs[CTRL_HUM] & 0x07] if self.chip_id != 0x58 else 0
+        ms = 1.25 + 2.3 * t_os
+        if p_os:
+            ms += 2.3 * p_os + 0.575
+        if h_os:
+            ms += 2.3 * h_os + 0.575
+        return ms
+
+    def _start_conversion(self):
+        self._busy_until = self._now() + self.conversion_ms()
+        self._finish_conversion()
+
+    def _update(self):
+        """Take any normal mode samples that are due"""
+        if self._next_sample is None or (self.regs[CTRL_MEAS] & 0x03) != 3:
+            return
+        now = self._now()
+        if now >= self._next_sample:
+            self._busy_until = now + self.conversion_ms()
+            self._finish_conversion()
+            standby = STANDBY_MS[self.regs[CONFIG] >> 5]
+            self._next_sample = now + self.conversion_ms() + standby
+
+    def _finish_conversion(self):
+        """Put the raw values in the data registers. The results are
+        there at once; the STATUS bit shows the time it would take"""
+        self.conversions += 1
+        adc_t = self._raw_temperature()
+        t_fine = _t_fine(adc_t)
+        adc_p = _search(lambda raw: -_pressure(raw, t_fine), -self.pressure)
+        data = bytearray(8)
+        data[0:3] = _pack20(adc_p)
+        data[3:6] = _pack20(adc_t)
+        if self.chip_id != 0x58:
+            adc_h = _search(lambda raw: _humidity(raw, t_fine), self.humidity,
+                            hi=0xFFFF)
+            data[6] = adc_h >> 8
+            data[7] = adc_h & 0xFF
+        self.regs[DATA:DATA + 8] = data
+        # the mode bits go back to sleep after a forced measurement
+        if self.regs[CTRL_MEAS] & 0x03 in (1, 2):
+            self.regs[CTRL_MEAS] &= 0xFC
+
+    def _raw_temperature(self):
+        return _search(lambda raw: _temperature(raw), self.temperature)
+
+
+def attach(bus, addr=0x76, **kwargs):
+    """Put a new simulated sensor on bus at addr and return it"""
+    device = BMX280(**kwargs)
+    I2C.devices[(bus, addr)] = device
+    return device
+
+
+def _pack20(value):
+    return bytes(((value >> 12) & 0xFF, (value >> 4) & 0xFF, (value & 0x0F) << 4))
+
+
+def _search(func, target, lo=0, hi=0xFFFFF):
+    """The raw value where increasing func(raw) reaches target"""
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if func(mid) < target:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _t_fine(adc_t):
+    t1, t2, t3 = CALIB_T
+    var1 = (((adc_t >> 3) - (t1 << 1)) * t2) >> 11
+    var2 = (((((adc_t >> 4) - t1) * ((adc_t >> 4) - t1)) >> 12) * t3) >> 14
+    return var1 + var2
+
+
+def _temperature(adc_t):
+    return ((_t_fine(adc_t) * 5 + 128) >> 8) / 100
+
+
+def _pressure(adc_p, t_fine):
+    p1, p2, p3, p4, p5, p6, p7, p8, p9 = CALIB_P
+    var1 = t_fine - 128000
+    var2 = var1 * var1 * p6
+    var2 = var2 + ((var1 * p5) << 17)
+    var2 = var2 + (p4 << 35)
+    var1 = ((var1 * var1 * p3) >> 8) + ((var1 * p2) << 12)
+    var1 = (((1 << 47) + var1) * p1) >> 33
+    if var1 == 0:
+        return 0
+    p = 1048576 - adc_p
+    p = int((((p << 31) - var2) * 3125) / var1)
+    var1 = (p9 * (p >> 13) * (p >> 13)) >> 25
+    var2 = (p8 * p) >> 19
+    return (((p + var1 + var2) >> 8) + (p7 << 4)) / 256
+
+
+def _humidity(adc_h, t_fine):
+    h1, h2, h3, h4, h5, h6 = CALIB_H
+    var1 = t_fine - 76800
+    var1 = (((((adc_h << 14) - (h4 << 20) - (h5 * var1)) + 16384) >> 15) *
+            (((((((var1 * h6) >> 10) * (((var1 * h3) >> 11) + 32768)) >> 10) +
+               2097152) * h2 + 8192) >> 14))
+    var1 = var1 - (((((var1 >> 15) * (var1 >> 15)) >> 7) * h1) >> 4)
+    var1 = min(max(var1, 0), 419430400)
+    return (var1 >> 12) / 1024
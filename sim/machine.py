@@ -0,0 +1,167 @@
+"""Stand in for the MicroPython machine module.
+
+Pins remember their level and tell any watchers when it changes. SPI
+writes go to SPI.device (the simulated panel) if one is attached. There
+are no devices on the I2C buses unless one is added to I2C.devices.
+"""
+
+import time
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    _levels = {}
+    _watchers = {}
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = mode
+        if value is not None:
+            self.value(value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        self.mode = mode
+        if value is not None:
+            self.value(value)
+
+    def value(self, v=None):
+        if v is None:
+            return Pin._levels.get(self.id, 0)
+        v = 1 if v else 0
+        if Pin._levels.get(self.id) != v:
+            Pin._levels[self.id] = v
+            for callback in Pin._watchers.get(self.id, ()):
+                callback(v)
+
+    __call__ = value
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    @classmethod
+    def level(cls, id):
+        """The level of pin id"""
+        return cls._levels.get(id, 1)
+
+    @classmethod
+    def watch(cls, id, callback):
+        """Call callback(level) when pin id changes"""
+        cls._watchers.setdefault(id, []).append(callback)
+
+
+class SPI:
+    device = None  # gets every write
+
+    def __init__(self, id=0, baudrate=1000000, **kwargs):
+        self.id = id
+        self.baudrate = baudrate
+
+    def init(self, baudrate=None, **kwargs):
+        if baudrate:
+            self.baudrate = baudrate
+
+    def deinit(self):
+        pass
+
+    def write(self, buf):
+        if SPI.device:
+            SPI.device.write(buf)
+
+    def read(self, nbytes, write=0x00):
+        return bytes(nbytes)
+
+    def readinto(self, buf, write=0x00):
+        for i in range(len(buf)):
+            buf[i] = 0
+
+    def write_readinto(self, write_buf, read_buf):
+        self.write(write_buf)
+        self.readinto(read_buf)
+
+
+class SoftSPI(SPI):
+    pass
+
+
+class I2C:
+    devices = {}  # (bus id, address): device with readfrom_mem/writeto_mem
+    # (SoftI2C buses use ('soft', scl pin id) for the bus id)
+
+    def __init__(self, id=-1, scl=None, sda=None, freq=400000, **kwargs):
+        self.id = id
+        self.scl = scl
+        self.sda = sda
+        self.freq = freq
+
+    def _device(self, addr):
+        device = I2C.devices.get((self.id, addr))
+        if device is None:
+            raise OSError(19)  # ENODEV
+        return device
+
+    def scan(self):
+        return sorted(addr for bus, addr in I2C.devices if bus == self.id)
+
+    def readfrom_mem(self, addr, memaddr, nbytes, **kwargs):
+        return self._device(addr).readfrom_mem(memaddr, nbytes)
+
+    def readfrom_mem_into(self, addr, memaddr, buf, **kwargs):
+        buf[:] = self._device(addr).readfrom_mem(memaddr, len(buf))
+
+    def writeto_mem(self, addr, memaddr, buf, **kwargs):
+        self._device(addr).writeto_mem(memaddr, bytes(buf))
+
+
+class SoftI2C(I2C):
+    """A bit banged bus is known by ('soft', scl pin id)"""
+
+    def __init__(self, scl=None, sda=None, freq=400000, **kwargs):
+        super().__init__(('soft', getattr(scl, 'id', -1)), scl, sda, freq)
+
+
+class PWM:
+    def __init__(self, pin, **kwargs):
+        self.pin = pin
+        self._duty = 0
+        self._freq = 0
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self._duty
+        self._duty = value
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        self._freq = value
+
+
+class ADC:
+    def __init__(self, pin):
+        self.pin = pin
+
+    def read_u16(self):
+        return 32768
+
+
+class RTC:
+    def datetime(self, dt=None):
+        if dt is None:
+            t = time.localtime()
+            return (t[0], t[1], t[2], t[6], t[3], t[4], t[5], 0)
+
+
+def reset():
+    raise SystemExit('machine.reset()')
+
+
+def unique_id():
+    return b'simulatr'
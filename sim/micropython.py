@@ -0,0 +1,20 @@
+"""Stand in for the MicroPython micropython module"""
+
+
+def const(x):
+    return x
+
+
+def native(f):
+    return f
+
+
+viper = native
+
+
+def mem_info(*args):
+    pass
+
+
+def alloc_emergency_exception_buf(size):
+    pass
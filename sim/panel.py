@@ -0,0 +1,224 @@
+"""
+A simulated ILI9341 display panel.
+
+The panel decodes the command stream written to the SPI bus (window,
+memory write, MADCTL and scrolling commands) in to a 240x320 RGB565
+framebuffer that can be saved as a png. It also counts the traffic so
+drawing code can be measured on the host.
+"""
+
+import struct
+import zlib
+
+from sim.machine import Pin
+
+SET_COLUMN = 0x2A
+SET_PAGE = 0x2B
+WRITE_RAM = 0x2C
+VSCRDEF = 0x33
+MADCTL = 0x36
+VSCRSADD = 0x37
+
+# MADCTL bits
+MY = 0x80
+MX = 0x40
+MV = 0x20
+DEFAULT_MADCTL = 0x88  # ili9341.Display rotation 0
+
+
+class Panel:
+    """Framebuffer and traffic counters for a simulated ILI9341.
+
+    Params:
+        dc: pin id of the data/command line
+        cs: pin id of the chip select line
+        width, height: panel size in its native portrait orientation
+
+    Properties:
+        fb: bytearray: RGB565 pixels, big endian, in native coordinates
+        madctl: int: last MADCTL value
+        scroll: (top fixed, scroll area, bottom fixed, start line)
+    """
+
+    def __init__(self, dc=6, cs=5, width=240, height=320):
+        self.dc = dc
+        self.cs = cs
+        self.width = width
+        self.height = height
+        self.fb = bytearray(width * height * 2)
+        self.madctl = DEFAULT_MADCTL
+        self.scroll = (0, height, 0, 0)
+        self._command = None
+        self._args = bytearray()
+        self._window = [0, width - 1, 0, height - 1]
+        self._x = 0
+        self._y = 0
+        self.reset_stats()
+        Pin.watch(cs, self._cs_changed)
+
+    def reset_stats(self):
+        """Zero the traffic counters, e.g. at the start of a frame"""
+        self.bytes = 0  # everything sent to the panel
+        self.pixel_bytes = 0  # bytes written to display memory
+        self.writes = 0  # spi.write calls
+        self.transactions = 0  # times CS was asserted
+        self.commands = 0
+        self.windows = 0  # memory writes started
+
+    def stats(self):
+        return {'bytes': self.bytes,
+                'pixel_bytes': self.pixel_bytes,
+                'writes': self.writes,
+                'transactions': self.transactions,
+                'commands': self.commands,
+                'windows': self.windows,
+                }
+
+    def _cs_changed(self, level):
+        if level == 0:
+            self.transactions += 1
+
+    def write(self, data):
+        """Take bytes written to the SPI bus"""
+        if Pin.level(self.cs) != 0:
+            return  # not for us
+        data = bytes(data)
+        self.writes += 1
+        self.bytes += len(data)
+        if Pin.level(self.dc) == 0:
+            for command in data:
+                self._start_command(command)
+        elif self._command == WRITE_RAM:
+            self.pixel_bytes += len(data)
+            self._write_pixels(data)
+        elif self._command is not None:
+            self._args += data
+            self._take_args()
+
+    def _start_command(self, command):
+        self.commands += 1
+        self._command = command
+        self._args = bytearray()
+        if command == WRITE_RAM:
+            self.windows += 1
+            self._x = self._window[0]
+            self._y = self._window[2]
+
+    def _take_args(self):
+        args = self._args
+        command = self._command
+        if command in (SET_COLUMN, SET_PAGE) and len(args) >= 4:
+            start, end = struct.unpack('>HH', args[:4])
+            i = 0 if command == SET_COLUMN else 2
+            self._window[i] = start
+            self._window[i + 1] = end
+        elif command == MADCTL and len(args) >= 1:
+            self.madctl = args[0]
+        elif command == VSCRDEF and len(args) >= 6:
+            top, area, bottom = struct.unpack('>HHH', args[:6])
+            self.scroll = (top, area, bottom, self.scroll[3])
+        elif command == VSCRSADD and len(args) >= 1:
+            start = args[0] if len(args) == 1 else struct.unpack('>H', args[:2])[0]
+            self.scroll = self.scroll[:3] + (start,)
+
+    def _write_pixels(self, data):
+        x0, x1, y0, y1 = self._window
+        x, y = self._x, self._y
+        i = 0
+        n = len(data) // 2 * 2
+        fast = (self.madctl & (MV | MX | MY)) == (DEFAULT_MADCTL & (MV | MX | MY))
+        while i < n and y <= y1:
+            count = min(x1 - x + 1, (n - i) // 2)
+            if fast:
+                if 0 <= y < self.height and x + count <= self.width:
+                    pos = (y * self.width + x) * 2
+                    self.fb[pos:pos + count * 2] = data[i:i + count * 2]
+            else:
+                for k in range(count):
+                    self._put(x + k, y, data[i + k * 2:i + k * 2 + 2])
+            i += count * 2
+            x += count
+            if x > x1:
+                x = x0
+                y += 1
+        self._x, self._y = x, y
+
+    def _put(self, col, page, pixel):
+        """Write one pixel for a MADCTL other than the default"""
+        if self.madctl & MV:
+            col, page = page, col
+        diff = self.madctl ^ DEFAULT_MADCTL
+        if diff & MX:
+            col = self.width - 1 - col
+        if diff & MY:
+            page = self.height - 1 - page
+        if 0 <= col < self.width and 0 <= page < self.height:
+            pos = (page * self.width + col) * 2
+            self.fb[pos:pos + 2] = pixel
+
+    def pixel(self, x, y):
+        """The RGB565 value in memory at native x, y"""
+        pos = (y * self.width + x) * 2
+        return (self.fb[pos] << 8) | self.fb[pos + 1]
+
+    def visible_row(self, line):
+        """The memory row shown on panel line after vertical scrolling"""
+        top, area, bottom, start = self.scroll
+        if area and top <= line < top + area:
+            return top + (line - top + start - top) % area
+        return line
+
+    def rgb(self, landscape=True):
+        """Return (width, height, rows of RGB888 bytes) as seen on screen.
+
+        landscape turns the image the way the weather station is viewed,
+        with the pins to the right.
+        """
+        rows = []
+        for line in range(self.height):
+            y = self.visible_row(line)
+            rows.append(self.fb[y * self.width * 2:(y + 1) * self.width * 2])
+        if not landscape:
+            return self.width, self.height, [_to_rgb888(r) for r in rows]
+
+        # landscape x runs from native y = height-1 down to 0, landscape y is native x
+        out = []
+        for x in range(self.width):
+            row = bytearray()
+            for y in range(self.height - 1, -1, -1):
+                row += rows[y][x * 2:x * 2 + 2]
+            out.append(_to_rgb888(row))
+        return self.height, self.width, out
+
+    def png(self, landscape=True):
+        """Return the screen as png file data"""
+        width, height, rows = self.rgb(landscape)
+        raw = b''.join(b'\x00' + bytes(row) for row in rows)
+
+        def chunk(kind, body):
+            return (struct.pack('>I', len(body)) + kind + body +
+                    struct.pack('>I', zlib.crc32(kind + body) & 0xffffffff))
+
+        return (b'\x89PNG\r\n\x1a\n' +
+                chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+                chunk(b'IDAT', zlib.compress(raw, 9)) +
+                chunk(b'IEND', b''))
+
+    def save_png(self, path, landscape=True):
+        with open(path, 'wb') as f:
+            f.write(self.png(landscape))
+
+
+def _to_rgb888(row):
+    """Convert big endian RGB565 bytes to RGB888 bytes"""
+    out = bytearray(len(row) // 2 * 3)
+    for i in range(0, len(row) - 1, 2):
+        v = (row[i] << 8) | row[i + 1]
+        r = (v >> 11) & 0x1F
+        g = (v >> 5) & 0x3F
+        b = v & 0x1F
+        j = i // 2 * 3
+        out[j] = (r << 3) | (r >> 2)
+        out[j + 1] = (g << 2) | (g >> 4)
+        out[j + 2] = (b << 3) | (b >> 2)
+    return out